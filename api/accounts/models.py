@@ -12,6 +12,7 @@ class User(config.Base):
     email = Column(String, unique=True, index=True)
     username = Column(String)
     hashed_password = Column(String)
+    token_version = Column(Integer, default=0, nullable=False)
     tokens = relationship("RefreshToken", back_populates="user")
 
 
@@ -19,10 +20,13 @@ class RefreshToken(config.Base):
     __tablename__ = 'refresh_tokens'
 
     token = Column(String, primary_key=True)
-    user_id = Column(Integer, ForeignKey('users.id'))
+    user_id = Column(Integer, ForeignKey('users.id'), index=True)
     user = relationship('User', back_populates='tokens')
+    # evaluated per row, so long running workers do not reuse the import time value.
+    # timezone aware, asyncpg rejects aware values for naive columns
     expires_at = Column(
-        DateTime,
-        default=datetime.now(timezone.utc) + timedelta(
+        DateTime(timezone=True),
+        index=True,
+        default=lambda: datetime.now(timezone.utc) + timedelta(
             days=config.REFRESH_TOKEN_EXPIRES_DAYS
         ))
@@ -0,0 +1,64 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import cached_property
+
+from fastapi import HTTPException, status
+
+import config
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt in a dedicated thread pool, so hashing does not block the event loop.
+    Hashes made with a different cost than BCRYPT_ROUNDS are reported for rehash
+
+    """
+
+    def __init__(self, rounds: int, workers: int, max_pending: int):
+        self.rounds = rounds
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password')
+        self.max_pending = max_pending
+        self.pending = 0
+
+    # passlib is imported on first hash, not when the app starts
+    @cached_property
+    def context(self):
+        from passlib.context import CryptContext
+
+        return CryptContext(
+            schemes=["bcrypt"],
+            deprecated="auto",
+            bcrypt__default_rounds=self.rounds,
+            bcrypt__min_rounds=self.rounds,
+            bcrypt__max_rounds=self.rounds,
+        )
+
+    async def run(self, func, *args):
+        if self.pending >= self.max_pending:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail='Server is busy, try again later.',
+                headers={'Retry-After': '1'},
+            )
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+        finally:
+            self.pending -= 1
+
+    async def hash(self, password: str) -> str:
+        return await self.run(self.context.hash, password)
+
+    async def verify(self, raw_password: str, hashed_password: str) -> bool:
+        return await self.run(self.context.verify, raw_password, hashed_password)
+
+    # returns (is_valid, new_hash), new_hash is None unless cost has changed
+    async def verify_and_update(self, raw_password: str, hashed_password: str):
+        return await self.run(self.context.verify_and_update, raw_password, hashed_password)
+
+
+password_hasher = PasswordHasher(
+    rounds=config.BCRYPT_ROUNDS,
+    workers=config.PASSWORD_HASH_WORKERS,
+    max_pending=config.PASSWORD_HASH_QUEUE_SIZE,
+)
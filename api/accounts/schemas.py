@@ -22,5 +22,9 @@ class UserInDB(UserBase):
     id: int
 
 
+class TokenUser(UserInDB):
+    token_version: int
+
+
 class RefreshToken(BaseModel):
     refresh: str
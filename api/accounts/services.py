@@ -1,33 +1,69 @@
+import time
+import uuid
+
 import jwt
 from datetime import timedelta, timezone, datetime
 from typing import Annotated
 from jwt.exceptions import InvalidTokenError
-from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 from sqlalchemy.exc import IntegrityError
-from psycopg2.errors import UniqueViolation
 
 import config
 from .models import User, RefreshToken
-from .schemas import UserInDB, UserLogin, UserRegister, UserRefreshTokenData
+from .passwords import password_hasher
+from .schemas import TokenUser, UserInDB, UserLogin, UserRegister, UserRefreshTokenData
+
+# postgres SQLSTATE, exposed as `pgcode` by both psycopg2 and asyncpg errors
+UNIQUE_VIOLATION = '23505'
+
+
+class TokenVersionCache:
+    """
+    Short-lived in-process copy of users token versions,
+    so access tokens are checked without a db query on every request
+
+    """
+
+    def __init__(self, ttl: int):
+        self.ttl = ttl
+        self.versions = {}
+
+    async def get(self, db: AsyncSession, user_id: int):
+        cached = self.versions.get(user_id)
+        if cached and time.monotonic() - cached[1] < self.ttl:
+            return cached[0]
+        result = await db.execute(select(User.token_version).filter(User.id == user_id))
+        token_version = result.scalar()
+        self.set(user_id, token_version)
+        return token_version
+
+    def set(self, user_id: int, token_version: int):
+        self.versions[user_id] = (token_version, time.monotonic())
+
+
+token_versions = TokenVersionCache(ttl=config.TOKEN_VERSION_CACHE_SECONDS)
 
 
 class JWTService:
-    pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
     oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
-    def get_user(self, db: Session, username: str) -> UserInDB:
-        user = db.query(User).filter(User.username == username).first()
+    async def get_user(self, db: AsyncSession, username: str) -> UserInDB:
+        # tokens are loaded eagerly, lazy loading is not available in async sessions
+        result = await db.execute(
+            select(User).options(selectinload(User.tokens)).filter(User.username == username))
+        user = result.scalars().first()
         if user:
             return user
 
-    def verify_password(self, raw_password: str, hashed_password: str):
-        return self.pwd_context.verify(raw_password, hashed_password)
+    async def verify_password(self, raw_password: str, hashed_password: str):
+        return await password_hasher.verify(raw_password, hashed_password)
 
-    def encrypt_password(self, password: str):
-        return self.pwd_context.hash(password)
+    async def encrypt_password(self, password: str):
+        return await password_hasher.hash(password)
 
     def check_user_tokens(self, user):
         if len(user.tokens) > 0:
@@ -38,14 +74,14 @@ class JWTService:
                 detail='Credentials error: Token expired.'
             )
 
-    def check_refresh_expired(self, db: Session, token: str):
-        token_in_db = db.query(RefreshToken).filter(RefreshToken.token == token).first()
+    async def check_refresh_expired(self, db: AsyncSession, token: str):
+        token_in_db = await db.get(RefreshToken, token)
         if token_in_db:
             if token_in_db.expires_at.tzinfo is None:
                 token_in_db.expires_at = token_in_db.expires_at.replace(tzinfo=timezone.utc)
             if datetime.now(timezone.utc) > token_in_db.expires_at:
-                db.delete(token_in_db)
-                db.commit()
+                await db.delete(token_in_db)
+                await db.commit()
                 raise HTTPException(
                     status_code=status.HTTP_403_FORBIDDEN,
                     detail='Credentials error: Token expired.')
@@ -66,38 +102,43 @@ class JWTService:
         encoded_jwt = jwt.encode(to_encode, config.SECRET_KEY, algorithm=config.ALGORITHM)
         return encoded_jwt
 
-    def create_refresh_token(self, db: Session, data: UserRefreshTokenData) -> RefreshToken:
-        user = self.get_user(db, username=data.username)
+    async def create_refresh_token(self, db: AsyncSession,
+                                   data: UserRefreshTokenData) -> RefreshToken:
+        user = await self.get_user(db, username=data.username)
         if not user:
             raise ValueError("User not found.")
 
-        token_data = {'sub': user.id}
+        # jti keeps tokens unique when a user logs in twice within a second
+        token_data = {'sub': user.id, 'jti': uuid.uuid4().hex}
         token = self.encode_data(token_data, token_type='refresh')
 
         db_token = RefreshToken(user=user, user_id=user.id, token=token)
         db.add(db_token)
-        db.commit()
+        await db.commit()
         return db_token
 
-    def create_access_token(self, db: Session, refresh_token: str) -> str:
+    async def create_access_token(self, db: AsyncSession, refresh_token: str) -> str:
         try:
             data = jwt.decode(refresh_token, config.SECRET_KEY, algorithms=[config.ALGORITHM])
             user_id = data.get('sub')
             if user_id is None:
                 raise InvalidTokenError("Credentials error.")
 
-            user = db.query(User).get(user_id)
+            user = await db.get(User, user_id)
             if not user:
                 raise ValueError("User not found.")
 
-            access_token_data = {'username': user.username}
+            access_token_data = {
+                'username': user.username,
+                'uid': user.id,
+                'ver': user.token_version,
+            }
             return self.encode_data(access_token_data, token_type='access')
 
         except InvalidTokenError:
             raise InvalidTokenError("Invalid refresh token.")
 
-    def get_current_user(self, token: Annotated[str, Depends(
-            oauth2_scheme)], db: Session = Depends(config.get_db)):
+    def decode_access_token(self, token: str) -> dict:
         credentials_exception = HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Could not validate credentials",
@@ -113,16 +154,42 @@ class JWTService:
                     status_code=status.HTTP_403_FORBIDDEN,
                     detail='Credentials error: Token expired.'
                 )
-            username = payload.get('username')
-            if username is None:
+            if payload.get('username') is None or payload.get('uid') is None:
                 raise credentials_exception
         except InvalidTokenError:
             raise credentials_exception
+        return payload
 
-        user = self.get_user(db, username=username)
-        self.check_user_tokens(user)
+    def check_token_version(self, payload: dict, token_version: int):
+        if token_version is None or payload.get('ver') != token_version:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail='Credentials error: Token revoked.',
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+
+    # trusts signed claims, db is queried only when cached token version is stale
+    async def get_token_user(self, token: Annotated[str, Depends(
+            oauth2_scheme)], db: AsyncSession = Depends(config.get_async_db)) -> TokenUser:
+        payload = self.decode_access_token(token)
+        token_version = await token_versions.get(db, payload['uid'])
+        self.check_token_version(payload, token_version)
+        return TokenUser(id=payload['uid'], username=payload['username'],
+                         token_version=token_version)
+
+    # loads full user row, for handlers that need more than token claims
+    async def get_current_user(self, token: Annotated[str, Depends(
+            oauth2_scheme)], db: AsyncSession = Depends(config.get_async_db)):
+        payload = self.decode_access_token(token)
+        user = await self.get_user(db, username=payload['username'])
         if user is None:
-            raise credentials_exception
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Could not validate credentials",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+        self.check_token_version(payload, user.token_version)
+        self.check_user_tokens(user)
         return user
 
 
@@ -130,56 +197,61 @@ class UserService:
     def __init__(self):
         self.jwt_service = JWTService()
 
-    def create_user(self, db: Session, user: User):
+    async def create_user(self, db: AsyncSession, user: User):
         try:
             db.add(user)
-            db.commit()
-            db.refresh(user)
+            await db.commit()
+            await db.refresh(user)
         except IntegrityError as e:
-            if isinstance(e.orig, UniqueViolation):
+            if getattr(e.orig, 'pgcode', None) == UNIQUE_VIOLATION:
                 raise ValueError('Email is already taken')
             else:
                 raise ValueError('An error occurred during user creation')
         return UserRefreshTokenData(**user.__dict__)
 
-    def register_user(self, data: UserRegister, db: Session = Depends(config.get_db)):
-        hashed_password = self.jwt_service.encrypt_password(data.password)
+    async def register_user(self, data: UserRegister,
+                            db: AsyncSession = Depends(config.get_async_db)):
+        hashed_password = await self.jwt_service.encrypt_password(data.password)
         user_data = User(
             username=data.username,
             email=data.email,
             hashed_password=hashed_password,
         )
         try:
-            user = self.create_user(db, user_data)
-            refresh_token = self.jwt_service.create_refresh_token(
+            user = await self.create_user(db, user_data)
+            refresh_token = await self.jwt_service.create_refresh_token(
                 db, data=UserRefreshTokenData(**user.__dict__))
-            access_token = self.jwt_service.create_access_token(refresh_token.token)
-            print(access_token)
-            db.commit()
+            access_token = await self.jwt_service.create_access_token(db, refresh_token.token)
+            await db.commit()
             return {'refresh': refresh_token.token, 'access': access_token}
 
         except (IntegrityError, ValueError, InvalidTokenError):
-            db.rollback()
+            await db.rollback()
             raise
 
         except Exception as e:
-            db.rollback()
+            await db.rollback()
             raise ValueError(f"Unexpected error: {str(e)}")
 
-    def login_user(self, data: UserLogin, db: Session = Depends(config.get_db)):
+    async def login_user(self, data: UserLogin,
+                         db: AsyncSession = Depends(config.get_async_db)):
         password = data.password
-        user = self.jwt_service.get_user(db, username=data.username)
+        user = await self.jwt_service.get_user(db, username=data.username)
         if user:
-            if self.jwt_service.verify_password(password, user.hashed_password):
+            is_valid, new_hash = await password_hasher.verify_and_update(
+                password, user.hashed_password)
+            if is_valid:
+                if new_hash:
+                    # bcrypt cost has changed since the hash was made
+                    user.hashed_password = new_hash
                 try:
-                    refresh_token = self.jwt_service.create_refresh_token(db, data=user)
-                    access_token = self.jwt_service.create_access_token(db, refresh_token.token)
-                    db.commit()
-                except ValueError:
-                    db.rollback()
+                    refresh_token = await self.jwt_service.create_refresh_token(db, data=user)
+                    access_token = await self.jwt_service.create_access_token(
+                        db, refresh_token.token)
+                    await db.commit()
+                except Exception:
+                    await db.rollback()
                     raise
-                except Exception as e:
-                    print(e)
                 return {'refresh': refresh_token.token, 'access': access_token}
             else:
                 raise HTTPException(
@@ -192,10 +264,13 @@ class UserService:
                 detail=f'Account with username {data.username} is not found'
             )
 
-    def logout(self, user, db: Session):
+    async def logout(self, user, db: AsyncSession):
         if len(user.tokens) > 0:
-            db.delete(user.tokens[0])
-            db.commit()
+            await db.delete(user.tokens[0])
+            # revokes every access token issued before
+            user.token_version += 1
+            await db.commit()
+            token_versions.set(user.id, user.token_version)
             return {'detail': 'Logged out successfully!'}
         else:
             raise HTTPException(
@@ -0,0 +1,58 @@
+import logging
+import threading
+from datetime import datetime, timezone
+
+from sqlalchemy import delete, select
+
+import config
+from .models import RefreshToken
+
+logger = logging.getLogger(__name__)
+
+
+class RefreshTokenPurger:
+    """
+    Periodically deletes expired refresh tokens,
+    REFRESH_TOKEN_PURGE_BATCH rows per transaction
+
+    """
+
+    def __init__(self, interval: int = None, batch_size: int = None):
+        self.interval = interval or config.REFRESH_TOKEN_PURGE_INTERVAL
+        self.batch_size = batch_size or config.REFRESH_TOKEN_PURGE_BATCH
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def purge(self) -> int:
+        deleted = 0
+        db = config.SessionLocal()
+        try:
+            while True:
+                expired = select(RefreshToken.token).filter(
+                    RefreshToken.expires_at < datetime.now(timezone.utc)
+                ).limit(self.batch_size).scalar_subquery()
+                result = db.execute(delete(RefreshToken).filter(RefreshToken.token.in_(expired)))
+                db.commit()
+                deleted += result.rowcount
+                if result.rowcount < self.batch_size:
+                    return deleted
+        finally:
+            db.close()
+
+    def loop(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                self.purge()
+            except Exception:
+                logger.exception('Refresh tokens purge failed')
+
+    def start(self):
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self.loop, name='token-purge', daemon=True)
+        self.thread.start()
+
+    def shutdown(self):
+        self.stopped.set()
+
+
+refresh_token_purger = RefreshTokenPurger()
@@ -1,6 +1,10 @@
 import os
+import re
+from functools import cache
+
 from dotenv import load_dotenv
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
@@ -11,29 +15,182 @@ SECRET_KEY = os.environ.get('SECRET_KEY')
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRES_MINUTES = 30
 REFRESH_TOKEN_EXPIRES_DAYS = 1
+# expired refresh tokens are deleted in background, in batches
+REFRESH_TOKEN_PURGE_INTERVAL = int(os.environ.get('REFRESH_TOKEN_PURGE_INTERVAL', 3600))
+REFRESH_TOKEN_PURGE_BATCH = int(os.environ.get('REFRESH_TOKEN_PURGE_BATCH', 1000))
+# password hashing, existing hashes are updated on login when BCRYPT_ROUNDS changes
+BCRYPT_ROUNDS = int(os.environ.get('BCRYPT_ROUNDS', 12))
+PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', min(os.cpu_count() or 1, 4)))
+PASSWORD_HASH_QUEUE_SIZE = int(os.environ.get('PASSWORD_HASH_QUEUE_SIZE', 64))
+# how long a revocation (logout) may take to reach other workers
+TOKEN_VERSION_CACHE_SECONDS = int(os.environ.get('TOKEN_VERSION_CACHE_SECONDS', 30))
 
 # database configuration
 SQLALCHEMY_DATABASE_URL = os.environ.get('SQLALCHEMY_DATABASE_URL')
+# async driver url, by default derived from the sync one
+SQLALCHEMY_ASYNC_DATABASE_URL = os.environ.get(
+    'SQLALCHEMY_ASYNC_DATABASE_URL',
+    re.sub(r'^postgres(ql)?(\+\w+)?://', 'postgresql+asyncpg://', SQLALCHEMY_DATABASE_URL or '')
+)
+
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 5))
+DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 10))
+DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT', 30))
+DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))
+DB_POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING', 'true').lower() in ('1', 'true', 'yes')
+
+pool_options = {
+    'pool_size': DB_POOL_SIZE,
+    'max_overflow': DB_MAX_OVERFLOW,
+    'pool_timeout': DB_POOL_TIMEOUT,
+    'pool_recycle': DB_POOL_RECYCLE,
+    'pool_pre_ping': DB_POOL_PRE_PING,
+}
+
+
+# engines are created on first use, so importing config does not load database drivers
+# sync engine is used by background threads (downloads, media store, migrations)
+@cache
+def get_engine():
+    return create_engine(SQLALCHEMY_DATABASE_URL, **pool_options)
+
+
+@cache
+def get_session_factory():
+    return sessionmaker(autocommit=False, autoflush=False, bind=get_engine())
+
+
+# async engine is used by request handlers
+@cache
+def get_async_engine():
+    return create_async_engine(SQLALCHEMY_ASYNC_DATABASE_URL, **pool_options)
+
+
+@cache
+def get_async_session_factory():
+    return async_sessionmaker(bind=get_async_engine(), autoflush=False, expire_on_commit=False)
+
+
+# config.engine, config.SessionLocal() etc. keep working
+LAZY_ATTRIBUTES = {
+    'engine': get_engine,
+    'SessionLocal': get_session_factory,
+    'async_engine': get_async_engine,
+    'AsyncSessionLocal': get_async_session_factory,
+}
+
+
+def __getattr__(name: str):
+    if name in LAZY_ATTRIBUTES:
+        return LAZY_ATTRIBUTES[name]()
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
 metadata = Base.metadata
 
 
 def get_db():
-    db = SessionLocal()
+    db = get_session_factory()()
     try:
         yield db
     finally:
         db.close()
 
 
+async def get_async_db():
+    async with get_async_session_factory()() as db:
+        yield db
+
+
 # tracks service vars
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-MEDIA_DIR = os.path.join(BASE_DIR, 'media')
+MEDIA_DIR = os.environ.get('MEDIA_DIR', os.path.join(BASE_DIR, 'media'))
 BASE_URL = 'http://127.0.0.1:8000'
 
+# youtube search results compared by duration, and the difference (seconds) of zero confidence
+YOUTUBE_MATCH_CANDIDATES = int(os.environ.get('YOUTUBE_MATCH_CANDIDATES', 3))
+YOUTUBE_MAX_DURATION_DIFF = float(os.environ.get('YOUTUBE_MAX_DURATION_DIFF', 30))
+# weaker matches are not saved, the recording is searched again next time
+YOUTUBE_MIN_CONFIDENCE = float(os.environ.get('YOUTUBE_MIN_CONFIDENCE', 0.5))
+
+# media storage, quota of 0 disables eviction
+MEDIA_QUOTA_BYTES = int(os.environ.get('MEDIA_QUOTA_BYTES', 20 * 1024 ** 3))
+MEDIA_EVICTION_TARGET = float(os.environ.get('MEDIA_EVICTION_TARGET', 0.9))
+MEDIA_EVICTION_INTERVAL = int(os.environ.get('MEDIA_EVICTION_INTERVAL', 300))
+
+# media streaming
+MEDIA_CHUNK_SIZE = int(os.environ.get('MEDIA_CHUNK_SIZE', 256 * 1024))
+MEDIA_MAX_AGE = int(os.environ.get('MEDIA_MAX_AGE', 86400))
+
+# progressive playback of tracks being downloaded
+PROGRESSIVE_POLL_INTERVAL = float(os.environ.get('PROGRESSIVE_POLL_INTERVAL', 0.2))
+PROGRESSIVE_START_TIMEOUT = float(os.environ.get('PROGRESSIVE_START_TIMEOUT', 30))
+
+# background download jobs
+DOWNLOAD_WORKERS = int(os.environ.get('DOWNLOAD_WORKERS', 4))
+DOWNLOAD_QUEUE_SIZE = int(os.environ.get('DOWNLOAD_QUEUE_SIZE', 100))
+# album/artist bulk downloads run in their own pool, so they don't hold up single tracks
+BULK_DOWNLOAD_WORKERS = int(os.environ.get('BULK_DOWNLOAD_WORKERS', 2))
+BULK_DOWNLOAD_QUEUE_SIZE = int(os.environ.get('BULK_DOWNLOAD_QUEUE_SIZE', 500))
+# a worker downloading a track holds a lease on its `tracks` row, renewed while it works;
+# other workers wait for it, and take the download over once the lease expires.
+# download jobs without a heartbeat for as long are resumed by another worker
+DOWNLOAD_LEASE_SECONDS = int(os.environ.get('DOWNLOAD_LEASE_SECONDS', 60))
+DOWNLOAD_LEASE_POLL_INTERVAL = float(os.environ.get('DOWNLOAD_LEASE_POLL_INTERVAL', 1))
+
+# predictive downloads of first tracks of viewed albums and artists top tracks
+PREFETCH_ENABLED = os.environ.get('PREFETCH_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+PREFETCH_TRACKS = int(os.environ.get('PREFETCH_TRACKS', 3))
+PREFETCH_WORKERS = int(os.environ.get('PREFETCH_WORKERS', 1))
+PREFETCH_QUEUE_SIZE = int(os.environ.get('PREFETCH_QUEUE_SIZE', 100))
+PREFETCH_DAILY_BUDGET = int(os.environ.get('PREFETCH_DAILY_BUDGET', 500))
+
 CLIENT_ID = os.environ.get('CLIENT_ID')
 CLIENT_SECRET = os.environ.get('CLIENT_SECRET')
+# spotify endpoints, can point to a proxy or a local stand-in
+SPOTIFY_API_URL = os.environ.get('SPOTIFY_API_URL', 'https://api.spotify.com/v1/')
+SPOTIFY_TOKEN_URL = os.environ.get('SPOTIFY_TOKEN_URL', 'https://accounts.spotify.com/api/token')
+# threads used for concurrent spotify requests
+SPOTIFY_MAX_WORKERS = int(os.environ.get('SPOTIFY_MAX_WORKERS', 8))
+# max uris accepted by /tracks/detail/batch/
+BATCH_DETAIL_MAX_URIS = int(os.environ.get('BATCH_DETAIL_MAX_URIS', 100))
+# local catalog of spotify metadata, used to answer searches before spotify
+CATALOG_ENABLED = os.environ.get('CATALOG_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+CATALOG_SEARCH_ENABLED = os.environ.get(
+    'CATALOG_SEARCH_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+CATALOG_MAX_AGE = int(os.environ.get('CATALOG_MAX_AGE', 7 * 86400))
+CATALOG_BATCH_SIZE = int(os.environ.get('CATALOG_BATCH_SIZE', 200))
+CATALOG_QUEUE_SIZE = int(os.environ.get('CATALOG_QUEUE_SIZE', 10000))
+# spotify http client
+SPOTIFY_POOL_SIZE = int(os.environ.get('SPOTIFY_POOL_SIZE', 20))
+SPOTIFY_TIMEOUT = float(os.environ.get('SPOTIFY_TIMEOUT', 10))
+SPOTIFY_RETRIES = int(os.environ.get('SPOTIFY_RETRIES', 3))
+SPOTIFY_BACKOFF = float(os.environ.get('SPOTIFY_BACKOFF', 0.5))
+SPOTIFY_MAX_RETRY_AFTER = float(os.environ.get('SPOTIFY_MAX_RETRY_AFTER', 30))
+# requests per second shared by all threads of the process, and burst size
+SPOTIFY_RATE_LIMIT = float(os.environ.get('SPOTIFY_RATE_LIMIT', 10))
+SPOTIFY_BURST = int(os.environ.get('SPOTIFY_BURST', 20))
+
+# spotify metadata cache
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'memory')  # memory | redis
+CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL', 'redis://localhost:6379/0')
+CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', 10000))
+CACHE_STALE_SECONDS = int(os.environ.get('CACHE_STALE_SECONDS', 600))
+CACHE_TTL_SECONDS = {
+    'search': int(os.environ.get('CACHE_SEARCH_TTL', 300)),
+    'track': int(os.environ.get('CACHE_TRACK_TTL', 86400)),
+    'album': int(os.environ.get('CACHE_ALBUM_TTL', 86400)),
+    'artist': int(os.environ.get('CACHE_ARTIST_TTL', 3600)),
+}
+
+# request profiling, by `X-Profile: <PROFILING_SECRET>` header (disabled when not set) or sampling
+PROFILING_SECRET = os.environ.get('PROFILING_SECRET')
+PROFILING_SAMPLE_RATE = float(os.environ.get('PROFILING_SAMPLE_RATE', 0))
+PROFILING_INTERVAL = float(os.environ.get('PROFILING_INTERVAL', 0.005))
+PROFILING_DIR = os.environ.get('PROFILING_DIR', os.path.join(BASE_DIR, 'profiles'))
+# requests slower than this are logged with their SQL statements
+SLOW_REQUEST_SECONDS = float(os.environ.get('SLOW_REQUEST_SECONDS', 2))
+SLOW_REQUEST_MAX_STATEMENTS = int(os.environ.get('SLOW_REQUEST_MAX_STATEMENTS', 100))
+# same statement repeated this many times in a request is reported as N+1
+N_PLUS_ONE_THRESHOLD = int(os.environ.get('N_PLUS_ONE_THRESHOLD', 5))
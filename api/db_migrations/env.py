@@ -25,7 +25,7 @@ if config.config_file_name is not None:
 # from myapp import mymodel
 # target_metadata = mymodel.Base.metadata
 from accounts.models import User, RefreshToken
-from tracks.models import Track
+from tracks.models import Track, DownloadJob, YoutubeResolution, CatalogTrack, CatalogAlbum, CatalogArtist
 target_metadata = app_conf.Base.metadata
 
 # other values from the config, defined by the needs of env.py,
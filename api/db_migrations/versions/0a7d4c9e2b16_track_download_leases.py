@@ -0,0 +1,30 @@
+"""track download leases
+
+Revision ID: 0a7d4c9e2b16
+Revises: f3c6d2e8b751
+Create Date: 2026-10-17 19:04:52.117604
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0a7d4c9e2b16'
+down_revision: Union[str, None] = 'f3c6d2e8b751'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('tracks', sa.Column('download_status', sa.String(), nullable=True))
+    op.add_column('tracks', sa.Column('download_owner', sa.String(), nullable=True))
+    op.add_column('tracks', sa.Column('lease_expires_at', sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('tracks', 'lease_expires_at')
+    op.drop_column('tracks', 'download_owner')
+    op.drop_column('tracks', 'download_status')
@@ -0,0 +1,28 @@
+"""download jobs bulk id
+
+Revision ID: 1c5e8f3a7d20
+Revises: 0a7d4c9e2b16
+Create Date: 2026-10-17 19:42:07.530918
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1c5e8f3a7d20'
+down_revision: Union[str, None] = '0a7d4c9e2b16'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('download_jobs', sa.Column('bulk_id', sa.String(), nullable=True))
+    op.create_index(op.f('ix_download_jobs_bulk_id'), 'download_jobs', ['bulk_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_download_jobs_bulk_id'), table_name='download_jobs')
+    op.drop_column('download_jobs', 'bulk_id')
@@ -0,0 +1,41 @@
+"""timezone aware timestamps of rows written through asyncpg
+
+Revision ID: 2e9b6d4f8a31
+Revises: 1c5e8f3a7d20
+Create Date: 2026-10-18 10:12:45.208113
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2e9b6d4f8a31'
+down_revision: Union[str, None] = '1c5e8f3a7d20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# existing values were written as utc
+COLUMNS = [
+    ('refresh_tokens', 'expires_at'),
+    ('download_jobs', 'created_at'),
+    ('download_jobs', 'updated_at'),
+]
+
+
+def upgrade() -> None:
+    for table, column in COLUMNS:
+        op.alter_column(table, column,
+                        type_=sa.DateTime(timezone=True),
+                        existing_type=sa.DateTime(),
+                        postgresql_using=f"{column} AT TIME ZONE 'UTC'")
+
+
+def downgrade() -> None:
+    for table, column in COLUMNS:
+        op.alter_column(table, column,
+                        type_=sa.DateTime(),
+                        existing_type=sa.DateTime(timezone=True),
+                        postgresql_using=f"{column} AT TIME ZONE 'UTC'")
@@ -0,0 +1,42 @@
+"""download jobs
+
+Revision ID: 8d1e4f2a6b3c
+Revises: 026affbb8233
+Create Date: 2026-10-17 10:12:40.518203
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8d1e4f2a6b3c'
+down_revision: Union[str, None] = '026affbb8233'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('download_jobs',
+    sa.Column('id', sa.String(), nullable=False),
+    sa.Column('track_uri', sa.String(), nullable=True),
+    sa.Column('track_id', sa.String(), nullable=True),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.Column('status', sa.String(), nullable=True),
+    sa.Column('media_url', sa.String(), nullable=True),
+    sa.Column('error', sa.String(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_download_jobs_status'), 'download_jobs', ['status'], unique=False)
+    op.create_index(op.f('ix_download_jobs_track_id'), 'download_jobs', ['track_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_download_jobs_track_id'), table_name='download_jobs')
+    op.drop_index(op.f('ix_download_jobs_status'), table_name='download_jobs')
+    op.drop_table('download_jobs')
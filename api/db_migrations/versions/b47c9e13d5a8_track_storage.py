@@ -0,0 +1,34 @@
+"""track storage
+
+Revision ID: b47c9e13d5a8
+Revises: 8d1e4f2a6b3c
+Create Date: 2026-10-17 11:40:03.271954
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b47c9e13d5a8'
+down_revision: Union[str, None] = '8d1e4f2a6b3c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('tracks', sa.Column('size_bytes', sa.BigInteger(), nullable=True))
+    op.add_column('tracks', sa.Column('play_count', sa.Integer(),
+                                      server_default='0', nullable=False))
+    op.add_column('tracks', sa.Column('last_accessed_at', sa.DateTime(), nullable=True))
+    op.add_column('tracks', sa.Column('evicted', sa.Boolean(),
+                                      server_default=sa.false(), nullable=False))
+
+
+def downgrade() -> None:
+    op.drop_column('tracks', 'evicted')
+    op.drop_column('tracks', 'last_accessed_at')
+    op.drop_column('tracks', 'play_count')
+    op.drop_column('tracks', 'size_bytes')
@@ -0,0 +1,27 @@
+"""user token version
+
+Revision ID: c2f8a0d61e97
+Revises: b47c9e13d5a8
+Create Date: 2026-10-17 13:05:51.904126
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c2f8a0d61e97'
+down_revision: Union[str, None] = 'b47c9e13d5a8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('users', sa.Column('token_version', sa.Integer(),
+                                     server_default='0', nullable=False))
+
+
+def downgrade() -> None:
+    op.drop_column('users', 'token_version')
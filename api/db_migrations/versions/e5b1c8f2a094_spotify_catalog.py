@@ -0,0 +1,45 @@
+"""spotify catalog
+
+Revision ID: e5b1c8f2a094
+Revises: d9a3b7c15f42
+Create Date: 2026-10-17 16:48:27.630512
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5b1c8f2a094'
+down_revision: Union[str, None] = 'd9a3b7c15f42'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+CATALOG_TABLES = ('catalog_tracks', 'catalog_albums', 'catalog_artists')
+
+
+def upgrade() -> None:
+    for table in CATALOG_TABLES:
+        op.create_table(table,
+        sa.Column('spotify_id', sa.String(), nullable=False),
+        sa.Column('name', sa.String(), nullable=True),
+        sa.Column('search_text', sa.String(), nullable=True),
+        sa.Column('data', postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.Column('search_vector', postgresql.TSVECTOR(), sa.Computed(
+            "to_tsvector('simple', coalesce(search_text, ''))", persisted=True), nullable=True),
+        sa.PrimaryKeyConstraint('spotify_id')
+        )
+        op.create_index(op.f(f'ix_{table}_updated_at'), table, ['updated_at'], unique=False)
+        op.create_index(f'ix_{table}_search_vector', table, ['search_vector'],
+                        unique=False, postgresql_using='gin')
+
+
+def downgrade() -> None:
+    for table in reversed(CATALOG_TABLES):
+        op.drop_index(f'ix_{table}_search_vector', table_name=table, postgresql_using='gin')
+        op.drop_index(op.f(f'ix_{table}_updated_at'), table_name=table)
+        op.drop_table(table)
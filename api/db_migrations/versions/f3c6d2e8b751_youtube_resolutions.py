@@ -0,0 +1,36 @@
+"""youtube resolutions
+
+Revision ID: f3c6d2e8b751
+Revises: e5b1c8f2a094
+Create Date: 2026-10-17 17:31:14.802337
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3c6d2e8b751'
+down_revision: Union[str, None] = 'e5b1c8f2a094'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('youtube_resolutions',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('recording_key', sa.String(), nullable=False),
+    sa.Column('video_id', sa.String(), nullable=False),
+    sa.Column('spotify_duration_ms', sa.Integer(), nullable=True),
+    sa.Column('youtube_duration_s', sa.Integer(), nullable=True),
+    sa.Column('confidence', sa.Float(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('recording_key')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('youtube_resolutions')
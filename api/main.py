@@ -1,12 +1,67 @@
-import uvicorn
+from contextlib import asynccontextmanager
+from functools import cache
+
 from fastapi import FastAPI
-from accounts.routes import app as accounts_app
-from tracks.routes import app as tracks_app
+from fastapi.responses import ORJSONResponse
+
+import metrics
+from profiling import RequestProfiler
+from accounts.routes import router as accounts_router
+from accounts.tasks import refresh_token_purger
+from tracks.routes import (
+    router as tracks_router, get_download_queue, get_music_service, get_prefetcher,
+)
+
+
+# spotify/youtube services are built here, so importing the app stays cheap
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    from prometheus_client import REGISTRY
+
+    music_service = get_music_service()
+    download_queue = get_download_queue()
+    prefetcher = get_prefetcher()
+    cache_collector = metrics.StatsCollector(
+        'metadata_cache', 'Spotify metadata cache lookups', music_service.cache.stats)
+    REGISTRY.register(cache_collector)
+    metrics.DOWNLOAD_QUEUE_DEPTH.set_function(download_queue.queue_depth)
+
+    download_queue.start()
+    music_service.media_store.start()
+    refresh_token_purger.start()
+    prefetcher.start()
+    music_service.catalog.start()
+    yield
+    music_service.catalog.shutdown()
+    prefetcher.shutdown()
+    download_queue.shutdown()
+    music_service.media_store.shutdown()
+    refresh_token_purger.shutdown()
+    REGISTRY.unregister(cache_collector)
 
 
-app = FastAPI()
-app.include_router(accounts_app.router, prefix='/accounts')
-app.include_router(tracks_app.router, prefix='/tracks')
+def create_app() -> FastAPI:
+    # routes returning plain data are serialized by their response_model and encoded with orjson
+    app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
+    app.include_router(accounts_router, prefix='/accounts')
+    app.include_router(tracks_router, prefix='/tracks')
+    app.add_middleware(RequestProfiler)
+    app.add_middleware(metrics.RequestMetrics)
+    app.add_route('/metrics', metrics.metrics_endpoint, include_in_schema=False)
+    return app
+
+
+get_app = cache(create_app)
+
+
+# `uvicorn main:app` keeps working, the app is created when first accessed
+def __getattr__(name: str):
+    if name == 'app':
+        return get_app()
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
 
 if __name__ == "__main__":
-    uvicorn.run('main:app', reload=True)
+    import uvicorn
+
+    uvicorn.run('main:create_app', factory=True, reload=True)
@@ -0,0 +1,160 @@
+import threading
+import time
+from contextlib import contextmanager
+from functools import cache
+
+from fastapi import Request, Response
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+LATENCY_BUCKETS = (.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30, 60)
+
+
+# metrics are created on first use, so importing the app does not load prometheus_client
+@cache
+def create_metrics() -> dict:
+    from prometheus_client import Counter, Gauge, Histogram
+
+    return {
+        'HTTP_REQUEST_DURATION': Histogram(
+            'http_request_duration_seconds',
+            'Time until response headers are sent, by route template',
+            ['method', 'route', 'status'], buckets=LATENCY_BUCKETS),
+        'UPSTREAM_DURATION': Histogram(
+            'upstream_request_duration_seconds', 'Calls to Spotify and YouTube',
+            ['upstream', 'operation'], buckets=LATENCY_BUCKETS),
+        'UPSTREAM_ERRORS': Counter(
+            'upstream_errors_total', 'Failed calls to Spotify and YouTube',
+            ['upstream', 'operation']),
+        'DB_QUERY_DURATION': Histogram(
+            'db_query_duration_seconds', 'SQL statements executed, by engine',
+            ['engine'], buckets=LATENCY_BUCKETS),
+        'DB_QUERY_ERRORS': Counter('db_query_errors_total', 'Failed SQL statements', ['engine']),
+        'DOWNLOAD_QUEUE_DEPTH': Gauge('download_queue_depth', 'Download jobs waiting for a worker'),
+        'MEDIA_BYTES_SERVED': Counter(
+            'media_bytes_served_total', 'Audio bytes sent to clients', ['source']),
+    }
+
+
+metrics_lock = threading.Lock()
+
+
+# first use can come from a download thread and the event loop at once,
+# a second registration of the same metrics would fail
+def get_metrics() -> dict:
+    with metrics_lock:
+        return create_metrics()
+
+
+# metrics.UPSTREAM_DURATION etc. keep working
+def __getattr__(name: str):
+    if not name.startswith('__') and name in get_metrics():
+        return get_metrics()[name]
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+# times the block, an exception counts as an upstream error
+@contextmanager
+def track_upstream(upstream: str, operation: str):
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        get_metrics()['UPSTREAM_ERRORS'].labels(upstream, operation).inc()
+        raise
+    finally:
+        get_metrics()['UPSTREAM_DURATION'].labels(upstream, operation).observe(
+            time.perf_counter() - started)
+
+
+def engine_name(conn) -> str:
+    return 'async' if conn.dialect.is_async else 'sync'
+
+
+# listens on Engine class, so engines created later (on first use) are covered
+@event.listens_for(Engine, 'before_cursor_execute')
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started_at', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info['query_started_at'].pop()
+    get_metrics()['DB_QUERY_DURATION'].labels(engine_name(conn)).observe(
+        time.perf_counter() - started)
+
+
+@event.listens_for(Engine, 'handle_error')
+def handle_error(context):
+    started_at = context.connection.info.get('query_started_at') if context.connection else None
+    if started_at:
+        started_at.pop()
+    get_metrics()['DB_QUERY_ERRORS'].labels(engine_name(context)).inc()
+
+
+class StatsCollector:
+    """
+    Exposes counters of a `stats()` dict, e.g. MetadataCache hits and misses
+
+    """
+
+    def __init__(self, name: str, documentation: str, stats):
+        self.name = name
+        self.documentation = documentation
+        self.stats = stats
+
+    def collect(self):
+        from prometheus_client.core import CounterMetricFamily
+
+        family = CounterMetricFamily(self.name, self.documentation, labels=['kind'])
+        for kind, value in self.stats().items():
+            family.add_metric([kind], value)
+        yield family
+
+
+class RequestMetrics:
+    """
+    Pure ASGI middleware timing requests until response headers are sent.
+    Messages are passed through unchanged, so zero-copy file sends keep working
+
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        responded = False
+
+        async def send_with_metrics(message: Message):
+            nonlocal responded
+            if message['type'] == 'http.response.start':
+                responded = True
+                self.observe(scope, message['status'], started)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_metrics)
+        finally:
+            if not responded:
+                self.observe(scope, 500, started)
+
+    # route template keeps label cardinality bounded, unmatched paths are grouped together
+    def observe(self, scope: Scope, status_code: int, started: float):
+        route = scope.get('route')
+        get_metrics()['HTTP_REQUEST_DURATION'].labels(
+            scope['method'],
+            route.path if route is not None else 'unmatched',
+            status_code,
+        ).observe(time.perf_counter() - started)
+
+
+def metrics_endpoint(request: Request) -> Response:
+    from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, generate_latest
+
+    return Response(generate_latest(REGISTRY), media_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,211 @@
+import hmac
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextvars import ContextVar
+
+import orjson
+from fastapi import Request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+import config
+
+PROFILE_HEADER = 'x-profile'
+PROFILE_ID_HEADER = 'X-Profile-Id'
+# statements of the current request, as [statement, seconds]
+request_queries: ContextVar[list | None] = ContextVar('request_queries', default=None)
+
+logger = logging.getLogger(__name__)
+
+LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+\b|\$\d+|%\(\w+\)s|\?")
+IN_LIST_RE = re.compile(r'\bIN\s*\((?:\s*\?(?:::\w+)?\s*,?)+\)', re.IGNORECASE)
+SPACE_RE = re.compile(r'\s+')
+
+
+# same statement with other parameters -> same pattern
+def statement_pattern(statement: str) -> str:
+    pattern = LITERAL_RE.sub('?', statement)
+    pattern = IN_LIST_RE.sub('IN (?)', pattern)
+    return SPACE_RE.sub(' ', pattern).strip()
+
+
+# patterns repeated at least N_PLUS_ONE_THRESHOLD times, most repeated first
+def repeated_queries(queries: list) -> list[dict]:
+    counts = Counter(statement_pattern(statement) for statement, _ in queries)
+    return [
+        {'statement': pattern, 'count': count}
+        for pattern, count in counts.most_common()
+        if count >= config.N_PLUS_ONE_THRESHOLD
+    ]
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if request_queries.get() is not None:
+        conn.info.setdefault('profiling_started_at', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    queries = request_queries.get()
+    if queries is not None and conn.info.get('profiling_started_at'):
+        started = conn.info['profiling_started_at'].pop()
+        queries.append([statement, time.perf_counter() - started])
+
+
+class StackSampler(threading.Thread):
+    """
+    Wall clock sampling profiler of all threads of the process, so sync routes running
+    in the threadpool are included. Idle threads (waiting for work or events) are skipped.
+    Output is in folded stacks format, readable by flamegraph.pl and speedscope
+
+    """
+
+    def __init__(self, interval: float):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self.stopped = threading.Event()
+
+    def idle(self, frame) -> bool:
+        code = frame.f_code
+        if code.co_name == 'select' and code.co_filename.endswith('selectors.py'):
+            return True
+        thread_module = os.path.join('futures', 'thread.py')
+        if code.co_name == '_worker' and code.co_filename.endswith(thread_module):
+            return True
+        caller = frame.f_back
+        return (code.co_name == 'wait' and code.co_filename.endswith('threading.py')
+                and caller is not None and (caller.f_code.co_filename.endswith('queue.py')
+                                            or caller.f_code.co_name == 'wait'))
+
+    def sample(self):
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == self.ident or self.idle(frame):
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                filename = os.path.basename(code.co_filename)
+                stack.append(f'{code.co_name} ({filename}:{code.co_firstlineno})')
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(stack))] += 1
+        self.samples += 1
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.sample()
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+    def folded(self) -> str:
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+
+class RequestProfiler:
+    """
+    Profiles requests sent with `X-Profile: <PROFILING_SECRET>` header,
+    or a PROFILING_SAMPLE_RATE share of all requests, one request at a time.
+    Profiles are saved to PROFILING_DIR and their id is returned in X-Profile-Id header.
+    Requests slower than SLOW_REQUEST_SECONDS are logged with their SQL statements.
+    Pure ASGI middleware, the request runs until its response headers are sent
+
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self.lock = threading.Lock()
+
+    def wanted(self, request: Request) -> bool:
+        secret = request.headers.get(PROFILE_HEADER)
+        if secret and config.PROFILING_SECRET:
+            return hmac.compare_digest(secret.encode(), config.PROFILING_SECRET.encode())
+        return random.random() < config.PROFILING_SAMPLE_RATE
+
+    def save(self, sampler: StackSampler, request: Request, wall: float, cpu: float) -> str:
+        profile_id = uuid.uuid4().hex
+        os.makedirs(config.PROFILING_DIR, exist_ok=True)
+        path = os.path.join(config.PROFILING_DIR, profile_id)
+        with open(f'{path}.folded', 'w') as file:
+            file.write(sampler.folded())
+        with open(f'{path}.json', 'wb') as file:
+            file.write(orjson.dumps({
+                'method': request.method,
+                'path': request.url.path,
+                'wall_seconds': wall,
+                # process cpu time, includes concurrent requests
+                'cpu_seconds': cpu,
+                'samples': sampler.samples,
+            }))
+        return profile_id
+
+    def log_slow(self, request: Request, status_code: int, wall: float, queries: list):
+        logger.warning(orjson.dumps({
+            'slow_request': f'{request.method} {request.url.path}',
+            'status': status_code,
+            'seconds': round(wall, 3),
+            'query_count': len(queries),
+            'query_seconds': round(sum(duration for _, duration in queries), 3),
+            'repeated_queries': repeated_queries(queries),
+            'queries': [
+                {'statement': statement, 'seconds': round(duration, 4)}
+                for statement, duration in queries[:config.SLOW_REQUEST_MAX_STATEMENTS]
+            ],
+        }).decode())
+
+    # stops sampling at response start, returns id of the saved profile
+    def finish(self, request: Request, sampler: StackSampler | None, queries: list,
+               started: float, cpu_started: float, status_code: int) -> str | None:
+        wall = time.perf_counter() - started
+        if sampler is not None:
+            sampler.stop()
+            self.lock.release()
+        if wall >= config.SLOW_REQUEST_SECONDS:
+            self.log_slow(request, status_code, wall, queries)
+        if sampler is not None:
+            return self.save(sampler, request, wall, time.process_time() - cpu_started)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        request = Request(scope)
+        sampler = None
+        if self.wanted(request) and self.lock.acquire(blocking=False):
+            sampler = StackSampler(config.PROFILING_INTERVAL)
+            sampler.start()
+        queries = []
+        token = request_queries.set(queries)
+        started, cpu_started = time.perf_counter(), time.process_time()
+        responded = False
+
+        async def send_with_profile(message: Message):
+            nonlocal responded
+            if message['type'] == 'http.response.start':
+                responded = True
+                profile_id = self.finish(
+                    request, sampler, queries, started, cpu_started, message['status'])
+                if profile_id is not None:
+                    headers = [*message.get('headers', []),
+                               (PROFILE_ID_HEADER.lower().encode(), profile_id.encode())]
+                    message = {**message, 'headers': headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_profile)
+        finally:
+            request_queries.reset(token)
+            if not responded:
+                self.finish(request, sampler, queries, started, cpu_started, 500)
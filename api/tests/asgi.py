@@ -0,0 +1,34 @@
+async def call(app, method: str = 'GET', path: str = '/', headers: dict = None,
+               extensions: dict = None) -> list:
+    """
+    Sends one request to an ASGI app and returns the messages it has sent,
+    without an http client or server
+
+    """
+
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': method,
+        'scheme': 'http',
+        'path': path,
+        'raw_path': path.encode(),
+        'root_path': '',
+        'query_string': b'',
+        'headers': [(name.lower().encode(), value.encode())
+                    for name, value in (headers or {}).items()],
+        'server': ('testserver', 80),
+        'client': ('127.0.0.1', 50000),
+        'extensions': extensions or {},
+    }
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        messages.append(message)
+
+    await app(scope, receive, send)
+    return messages
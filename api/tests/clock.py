@@ -0,0 +1,20 @@
+class FakeClock:
+    """
+    Stands in for the `time` module of the code under test,
+    sleep() moves the clock instead of waiting
+
+    """
+
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+        self.slept = 0.0
+
+    def time(self) -> float:
+        return self.now
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float):
+        self.now += seconds
+        self.slept += seconds
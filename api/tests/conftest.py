@@ -0,0 +1,33 @@
+import os
+import sys
+
+import pytest
+
+# tests import api modules the way the app does (`import config`, `from tracks...`)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# config is read on import, database tests use TEST_DATABASE_URL only
+os.environ.setdefault('SECRET_KEY', 'test-secret')
+os.environ.setdefault('BCRYPT_ROUNDS', '4')
+os.environ.setdefault('CLIENT_ID', 'test-client')
+os.environ.setdefault('CLIENT_SECRET', 'test-secret')
+if os.environ.get('TEST_DATABASE_URL'):
+    os.environ['SQLALCHEMY_DATABASE_URL'] = os.environ['TEST_DATABASE_URL']
+    os.environ.pop('SQLALCHEMY_ASYNC_DATABASE_URL', None)
+
+
+# async tests run on asyncio only, the app does not support trio
+@pytest.fixture
+def anyio_backend():
+    return 'asyncio'
+
+
+# empty tables on TEST_DATABASE_URL, see database.requires_database
+@pytest.fixture
+def tables():
+    import config
+    from accounts import models as accounts_models  # noqa: F401
+    from tracks import models as tracks_models  # noqa: F401
+
+    config.Base.metadata.drop_all(config.engine)
+    config.Base.metadata.create_all(config.engine)
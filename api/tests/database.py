@@ -0,0 +1,7 @@
+import os
+
+import pytest
+
+# database tests drop and create all tables of TEST_DATABASE_URL
+requires_database = pytest.mark.skipif(
+    not os.environ.get('TEST_DATABASE_URL'), reason='TEST_DATABASE_URL is not set')
@@ -0,0 +1,96 @@
+import pytest
+from fastapi import HTTPException
+
+from accounts import services as services_module
+from accounts.services import JWTService, TokenVersionCache
+from clock import FakeClock
+
+
+class VersionResult:
+    def __init__(self, value):
+        self.value = value
+
+    def scalar(self):
+        return self.value
+
+
+class VersionSession:
+    """
+    Returns the current token version of every user,
+    counting how often the db was asked
+
+    """
+
+    def __init__(self, version):
+        self.version = version
+        self.queries = 0
+
+    async def execute(self, statement):
+        self.queries += 1
+        return VersionResult(self.version)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(services_module, 'time', clock)
+    return clock
+
+
+def make_access_token(version):
+    return JWTService().encode_data({'username': 'alice', 'uid': 1, 'ver': version},
+                                    token_type='access')
+
+
+def test_access_token_with_current_version_is_accepted():
+    jwt_service = JWTService()
+    payload = jwt_service.decode_access_token(make_access_token(3))
+    jwt_service.check_token_version(payload, 3)
+    assert payload['uid'] == 1
+
+
+@pytest.mark.parametrize('token_version', [4, None])
+def test_access_token_with_stale_version_is_revoked(token_version):
+    jwt_service = JWTService()
+    payload = jwt_service.decode_access_token(make_access_token(3))
+    with pytest.raises(HTTPException) as error:
+        jwt_service.check_token_version(payload, token_version)
+    assert error.value.status_code == 401
+    assert error.value.detail == 'Credentials error: Token revoked.'
+
+
+def test_access_token_without_claims_is_rejected():
+    jwt_service = JWTService()
+    token = jwt_service.encode_data({'username': 'alice'}, token_type='access')
+    with pytest.raises(HTTPException) as error:
+        jwt_service.decode_access_token(token)
+    assert error.value.status_code == 401
+
+
+@pytest.mark.anyio
+async def test_token_version_cache_reloads_after_ttl(clock):
+    cache = TokenVersionCache(ttl=30)
+    db = VersionSession(version=0)
+    assert await cache.get(db, 1) == 0
+    db.version = 1
+    clock.now += 10
+    assert await cache.get(db, 1) == 0
+    assert db.queries == 1
+    clock.now += 25
+    assert await cache.get(db, 1) == 1
+    assert db.queries == 2
+
+
+@pytest.mark.anyio
+async def test_logout_revokes_tokens_without_waiting_for_ttl(clock):
+    cache = TokenVersionCache(ttl=30)
+    db = VersionSession(version=0)
+    jwt_service = JWTService()
+    payload = jwt_service.decode_access_token(make_access_token(0))
+    jwt_service.check_token_version(payload, await cache.get(db, 1))
+
+    # logout bumps the version and refreshes the local copy
+    cache.set(1, 1)
+    with pytest.raises(HTTPException):
+        jwt_service.check_token_version(payload, await cache.get(db, 1))
+    assert db.queries == 1
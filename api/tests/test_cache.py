@@ -0,0 +1,88 @@
+import threading
+
+import pytest
+
+from tracks import cache as cache_module
+from tracks.cache import MemoryCacheBackend, MetadataCache
+from clock import FakeClock
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(cache_module, 'time', clock)
+    return clock
+
+
+def make_cache(max_entries=100, stale_seconds=0):
+    return MetadataCache(MemoryCacheBackend(max_entries), ttls={'track': 10},
+                         stale_seconds=stale_seconds)
+
+
+def test_entry_expires_after_ttl(clock):
+    cache = make_cache()
+    cache.put('track', 'a', 'value')
+    clock.now += 5
+    assert cache.get('track', 'a') == 'value'
+    clock.now += 6
+    assert cache.get('track', 'a') is None
+    assert cache.get_or_load('track', 'a', lambda: 'reloaded') == 'reloaded'
+    assert cache.stats()['misses'] == 2
+
+
+def test_entity_without_ttl_is_not_cached(clock):
+    cache = make_cache()
+    calls = []
+    for _ in range(2):
+        cache.get_or_load('search', 'q', lambda: calls.append(1))
+    assert len(calls) == 2
+
+
+def test_least_recently_used_entry_is_evicted(clock):
+    cache = make_cache(max_entries=2)
+    cache.put('track', 'a', 1)
+    cache.put('track', 'b', 2)
+    assert cache.get('track', 'a') == 1
+    cache.put('track', 'c', 3)
+    assert cache.get('track', 'b') is None
+    assert cache.get('track', 'a') == 1
+    assert cache.get('track', 'c') == 3
+    assert cache.stats()['evictions'] == 1
+
+
+def test_stale_entry_is_served_while_refreshed_once(clock):
+    cache = make_cache(stale_seconds=100)
+    cache.get_or_load('track', 'a', lambda: 'old')
+    clock.now += 20
+
+    release = threading.Event()
+    calls = []
+
+    def slow_loader():
+        calls.append(1)
+        release.wait(5)
+        return 'new'
+
+    assert cache.get_or_load('track', 'a', slow_loader) == 'old'
+    assert cache.get_or_load('track', 'a', slow_loader) == 'old'
+    release.set()
+    cache.executor.shutdown(wait=True)
+
+    assert len(calls) == 1
+    assert cache.get_or_load('track', 'a', lambda: 'unexpected load') == 'new'
+    assert cache.stats()['stale_hits'] == 2
+
+
+def test_failed_refresh_keeps_stale_entry(clock):
+    cache = make_cache(stale_seconds=100)
+    cache.get_or_load('track', 'a', lambda: 'old')
+    clock.now += 20
+
+    def failing_loader():
+        raise RuntimeError('spotify is down')
+
+    assert cache.get_or_load('track', 'a', failing_loader) == 'old'
+    cache.executor.shutdown(wait=True)
+    # next stale hit may try again
+    assert cache.refreshing == set()
+    assert cache.backend.get('track:a')[0] == 'old'
@@ -0,0 +1,111 @@
+import os
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import config
+from accounts.models import RefreshToken
+from accounts.schemas import UserLogin, UserRegister
+from accounts.services import UserService
+from tracks import models  # noqa: F401, tables of tracks
+from tracks.jobs import DownloadQueue
+from tracks.models import DownloadJob
+
+# tables of the database are dropped and created again
+pytestmark = [
+    pytest.mark.anyio,
+    pytest.mark.skipif(not os.environ.get('TEST_DATABASE_URL'),
+                       reason='TEST_DATABASE_URL is not set'),
+]
+
+
+@pytest.fixture
+async def db():
+    config.Base.metadata.drop_all(config.engine)
+    config.Base.metadata.create_all(config.engine)
+    async with config.AsyncSessionLocal() as session:
+        yield session
+    # asyncpg connections belong to the event loop of the test
+    await config.async_engine.dispose()
+
+
+class RecordingExecutor:
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, func, *args, **kwargs):
+        self.submitted.append(args)
+
+
+async def register(db, username: str) -> dict:
+    data = UserRegister(username=username, email=f'{username}@example.com', password='secret')
+    return await UserService().register_user(data, db)
+
+
+# requests write through asyncpg, which rejects aware datetimes in naive columns
+async def test_register_and_login_store_refresh_tokens(db):
+    tokens = await register(db, 'alice')
+    assert tokens['refresh'] and tokens['access']
+
+    tokens = await UserService().login_user(UserLogin(username='alice', password='secret'), db)
+    refresh_token = await db.get(RefreshToken, tokens['refresh'])
+    assert refresh_token is not None
+    assert refresh_token.expires_at.tzinfo is not None
+
+
+async def test_create_job_reuses_active_job_of_same_user_only(db):
+    await register(db, 'alice')
+    await register(db, 'bob')
+    queue = DownloadQueue(music_service=None)
+    queue.executor = RecordingExecutor()
+
+    job = await queue.create_job('spotify:track:abc', user_id=1, db=db)
+    assert job.status == DownloadJob.QUEUED
+    assert job.created_at.tzinfo is not None
+    assert await queue.create_job('spotify:track:abc', user_id=1, db=db) is job
+
+    other = await queue.create_job('spotify:track:abc', user_id=2, db=db)
+    assert other.id != job.id
+    assert queue.executor.submitted == [(job.id,), (other.id,)]
+    assert queue.queue_depth() == 2
+
+
+async def add_job(db, job_id: str, status: str, age_seconds: int, bulk_id: str = None):
+    updated_at = datetime.now(timezone.utc) - timedelta(seconds=age_seconds)
+    db.add(DownloadJob(id=job_id, bulk_id=bulk_id, track_uri=f'spotify:track:{job_id}',
+                       track_id=job_id, status=status, updated_at=updated_at))
+    await db.commit()
+
+
+async def test_resume_takes_only_jobs_without_heartbeat(db):
+    lease = config.DOWNLOAD_LEASE_SECONDS
+    await add_job(db, 'orphan', DownloadJob.DOWNLOADING, age_seconds=lease * 2)
+    await add_job(db, 'bulk-orphan', DownloadJob.QUEUED, age_seconds=lease * 2, bulk_id='b')
+    await add_job(db, 'running', DownloadJob.DOWNLOADING, age_seconds=1)
+    await add_job(db, 'done', DownloadJob.DONE, age_seconds=lease * 2)
+    queue = DownloadQueue(music_service=None)
+    queue.executor, queue.bulk_executor = RecordingExecutor(), RecordingExecutor()
+
+    queue.resume()
+    assert queue.executor.submitted == [('orphan',)]
+    assert queue.bulk_executor.submitted == [('bulk-orphan',)]
+    assert queue.jobs == {'orphan', 'bulk-orphan'}
+
+    # taken jobs are fresh now, another worker resuming does not run them again
+    other = DownloadQueue(music_service=None)
+    other.executor, other.bulk_executor = RecordingExecutor(), RecordingExecutor()
+    other.resume()
+    assert other.executor.submitted == other.bulk_executor.submitted == []
+
+
+async def test_heartbeat_keeps_jobs_of_this_worker(db):
+    lease = config.DOWNLOAD_LEASE_SECONDS
+    await add_job(db, 'mine', DownloadJob.QUEUED, age_seconds=lease * 2)
+    queue = DownloadQueue(music_service=None)
+    queue.add_jobs(['mine'])
+    queue.heartbeat()
+
+    other = DownloadQueue(music_service=None)
+    other.executor, other.bulk_executor = RecordingExecutor(), RecordingExecutor()
+    other.resume()
+    assert other.executor.submitted == []
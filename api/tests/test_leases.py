@@ -0,0 +1,78 @@
+import time
+from contextlib import contextmanager
+
+from sqlalchemy import update
+
+import config
+from tracks.leases import DownloadLeases
+from tracks.models import Track
+from tracks.services import MusicSearchService
+from database import requires_database
+
+pytestmark = requires_database
+
+
+def take_over(track_id: str, owner: str = 'other-worker'):
+    db = config.SessionLocal()
+    try:
+        db.execute(update(Track).where(Track.track_id == track_id).values(download_owner=owner))
+        db.commit()
+    finally:
+        db.close()
+
+
+def wait_until(condition, timeout: float = 5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.05)
+
+
+def test_claimed_lease_is_exclusive(tables):
+    leases, other = DownloadLeases(lease_seconds=60), DownloadLeases(lease_seconds=60)
+    assert leases.claim('t1')
+    assert not other.claim('t1')
+    leases.release('t1', Track.READY)
+    assert other.claim('t1')
+
+
+def test_hold_reports_lost_lease(tables):
+    leases = DownloadLeases(lease_seconds=1)
+    assert leases.claim('t1')
+    with leases.hold('t1') as lease:
+        assert not lease.lost
+        take_over('t1')
+        wait_until(lambda: lease.lost)
+
+
+def test_fetch_track_leaves_row_to_new_owner(tables, monkeypatch, tmp_path):
+    service = MusicSearchService()
+    service.leases = DownloadLeases(lease_seconds=1)
+    held = []
+    hold = service.leases.hold
+
+    @contextmanager
+    def recording_hold(track_id: str):
+        with hold(track_id) as lease:
+            held.append(lease)
+            yield lease
+
+    def download_recording(track_id, artist, name, duration_ms, db):
+        take_over(track_id)
+        wait_until(lambda: held[0].lost)
+        path = tmp_path / f'{track_id}.mp3'
+        path.write_bytes(b'x' * 10)
+        return str(path)
+
+    monkeypatch.setattr(service.leases, 'hold', recording_hold)
+    monkeypatch.setattr(service, 'download_recording', download_recording)
+    db = config.SessionLocal()
+    try:
+        track_data = {'name': 'Song', 'artists': [{'name': 'Artist'}], 'duration_ms': 1000}
+        service.fetch_track('spotify:track:t1', 't1', db, track_data)
+        track = db.query(Track).populate_existing().filter(Track.track_id == 't1').one()
+        assert track.file_path is None
+        assert track.download_owner == 'other-worker'
+        assert track.download_status == Track.DOWNLOADING
+    finally:
+        db.close()
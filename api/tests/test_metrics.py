@@ -0,0 +1,57 @@
+import pytest
+from fastapi import FastAPI
+from prometheus_client import REGISTRY
+
+import metrics
+from tracks.streaming import MediaFileResponse
+from asgi import call
+
+pytestmark = pytest.mark.anyio
+
+ZEROCOPY = 'http.response.zerocopysend'
+
+
+def request_count(method: str, route: str, status: str) -> float:
+    return REGISTRY.get_sample_value(
+        'http_request_duration_seconds_count',
+        {'method': method, 'route': route, 'status': status},
+    ) or 0
+
+
+def make_app(media_path: str = None) -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(metrics.RequestMetrics)
+
+    @app.get('/items/{item_id}')
+    def get_item(item_id: int):
+        return {'id': item_id}
+
+    @app.get('/files/{name}')
+    async def get_file(name: str):
+        return MediaFileResponse(media_path, 0, 9, 206, {}, 'audio/mpeg')
+
+    return app
+
+
+async def test_request_is_labelled_by_route_template():
+    before = request_count('GET', '/items/{item_id}', '200')
+    messages = await call(make_app(), path='/items/1')
+    assert messages[0]['status'] == 200
+    assert request_count('GET', '/items/{item_id}', '200') == before + 1
+
+
+async def test_unmatched_path_is_grouped():
+    before = request_count('GET', 'unmatched', '404')
+    await call(make_app(), path='/missing/1')
+    await call(make_app(), path='/missing/2')
+    assert request_count('GET', 'unmatched', '404') == before + 2
+
+
+async def test_zerocopy_send_is_passed_through(tmp_path):
+    media_path = tmp_path / 'a.mp3'
+    media_path.write_bytes(b'x' * 100)
+    before = request_count('GET', '/files/{name}', '206')
+    messages = await call(make_app(str(media_path)), path='/files/a.mp3', extensions={ZEROCOPY: {}})
+    assert [message['type'] for message in messages] == ['http.response.start', ZEROCOPY]
+    assert messages[1]['count'] == 10
+    assert request_count('GET', '/files/{name}', '206') == before + 1
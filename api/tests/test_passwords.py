@@ -0,0 +1,52 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from accounts.passwords import PasswordHasher
+
+pytestmark = pytest.mark.anyio
+
+
+def make_hasher(rounds=4, max_pending=10):
+    return PasswordHasher(rounds=rounds, workers=1, max_pending=max_pending)
+
+
+async def test_hash_with_current_cost_is_not_rehashed():
+    hasher = make_hasher()
+    hashed = await hasher.hash('secret')
+    assert await hasher.verify('secret', hashed)
+    assert await hasher.verify_and_update('secret', hashed) == (True, None)
+    assert await hasher.verify_and_update('wrong', hashed) == (False, None)
+
+
+async def test_hash_with_old_cost_is_rehashed():
+    hashed = await make_hasher(rounds=4).hash('secret')
+    hasher = make_hasher(rounds=5)
+    is_valid, new_hash = await hasher.verify_and_update('secret', hashed)
+    assert is_valid
+    assert new_hash.startswith('$2b$05$')
+    assert await hasher.verify_and_update('secret', new_hash) == (True, None)
+
+
+async def test_full_queue_is_rejected_with_503():
+    hasher = make_hasher(max_pending=1)
+    started = asyncio.Event()
+    release = asyncio.Event()
+    loop = asyncio.get_running_loop()
+
+    def block():
+        loop.call_soon_threadsafe(started.set)
+        asyncio.run_coroutine_threadsafe(release.wait(), loop).result()
+
+    running = asyncio.create_task(hasher.run(block))
+    await started.wait()
+    with pytest.raises(HTTPException) as error:
+        await hasher.hash('secret')
+    assert error.value.status_code == 503
+    assert error.value.headers == {'Retry-After': '1'}
+
+    release.set()
+    await running
+    assert hasher.pending == 0
+    assert await hasher.hash('secret')
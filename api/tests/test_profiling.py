@@ -0,0 +1,65 @@
+import logging
+
+import orjson
+import pytest
+from fastapi import FastAPI
+
+import config
+from profiling import RequestProfiler, request_queries
+from asgi import call
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def profiling(monkeypatch, tmp_path):
+    monkeypatch.setattr(config, 'PROFILING_SECRET', 'secret')
+    monkeypatch.setattr(config, 'PROFILING_SAMPLE_RATE', 0)
+    monkeypatch.setattr(config, 'PROFILING_DIR', str(tmp_path))
+    return tmp_path
+
+
+def make_app() -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(RequestProfiler)
+
+    @app.get('/items/{item_id}')
+    async def get_item(item_id: int):
+        # stands in for the engine event, queries are collected in the request context
+        for _ in range(config.N_PLUS_ONE_THRESHOLD):
+            request_queries.get().append([f'SELECT * FROM items WHERE id = {item_id}', 0.001])
+        return {'id': item_id}
+
+    return app
+
+
+async def test_profiled_request_returns_profile_id(profiling):
+    messages = await call(make_app(), path='/items/1', headers={'X-Profile': 'secret'})
+    headers = dict(messages[0]['headers'])
+    profile_id = headers[b'x-profile-id'].decode()
+    assert orjson.loads(messages[1]['body']) == {'id': 1}
+
+    with open(profiling / f'{profile_id}.json', 'rb') as file:
+        profile = orjson.loads(file.read())
+    assert profile['path'] == '/items/1'
+    assert (profiling / f'{profile_id}.folded').exists()
+
+
+@pytest.mark.parametrize('headers', [{}, {'X-Profile': 'wrong'}])
+async def test_request_without_secret_is_not_profiled(profiling, headers):
+    messages = await call(make_app(), path='/items/1', headers=headers)
+    assert b'x-profile-id' not in dict(messages[0]['headers'])
+    assert list(profiling.iterdir()) == []
+
+
+async def test_slow_request_is_logged_with_repeated_queries(profiling, monkeypatch, caplog):
+    monkeypatch.setattr(config, 'SLOW_REQUEST_SECONDS', 0)
+    with caplog.at_level(logging.WARNING, logger='profiling'):
+        await call(make_app(), path='/items/1')
+    entry = orjson.loads(caplog.records[0].getMessage())
+    assert entry['slow_request'] == 'GET /items/1'
+    assert entry['status'] == 200
+    assert entry['query_count'] == config.N_PLUS_ONE_THRESHOLD
+    assert entry['repeated_queries'] == [
+        {'statement': 'SELECT * FROM items WHERE id = ?', 'count': config.N_PLUS_ONE_THRESHOLD},
+    ]
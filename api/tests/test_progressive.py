@@ -0,0 +1,104 @@
+import queue
+import threading
+
+import pytest
+from pytubefix import request
+
+import config
+from tracks.progressive import ProgressiveDownload
+
+pytestmark = pytest.mark.anyio
+
+
+class Upstream:
+    """
+    Replaces pytubefix request.stream, chunks are fed by the test,
+    an exception ends the stream with that error
+
+    """
+
+    def __init__(self):
+        self.chunks = queue.Queue()
+
+    def stream(self, url):
+        while True:
+            chunk = self.chunks.get()
+            if chunk is None:
+                return
+            if isinstance(chunk, Exception):
+                raise chunk
+            yield chunk
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    upstream = Upstream()
+    monkeypatch.setattr(request, 'stream', upstream.stream)
+    monkeypatch.setattr(config, 'PROGRESSIVE_POLL_INTERVAL', 0.01)
+    return upstream
+
+
+@pytest.fixture
+def download(tmp_path, upstream):
+    download = ProgressiveDownload(str(tmp_path / 'media' / 'track.mp3'), 'https://youtube/')
+    yield download
+    upstream.chunks.put(None)
+
+
+def start(download):
+    def run():
+        try:
+            download.run()
+        except Exception:
+            pass
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    download.started.wait()
+    return thread
+
+
+async def read_body(download):
+    return [chunk async for chunk in download.iter_chunks()]
+
+
+async def test_listener_receives_whole_file(download, upstream):
+    thread = start(download)
+    upstream.chunks.put(b'a' * 10)
+    upstream.chunks.put(b'b' * 10)
+    upstream.chunks.put(None)
+    body = await read_body(download)
+    thread.join()
+    assert b''.join(body) == b'a' * 10 + b'b' * 10
+    with open(download.path, 'rb') as file:
+        assert file.read() == b''.join(body)
+
+
+async def test_chunks_are_bounded(download, upstream, monkeypatch):
+    monkeypatch.setattr(config, 'MEDIA_CHUNK_SIZE', 4)
+    thread = start(download)
+    upstream.chunks.put(b'x' * 10)
+    upstream.chunks.put(None)
+    body = await read_body(download)
+    thread.join()
+    assert [len(chunk) for chunk in body] == [4, 4, 2]
+
+
+async def test_failed_download_truncates_body(download, upstream):
+    thread = start(download)
+    upstream.chunks.put(b'a' * 10)
+    chunks = download.iter_chunks()
+    assert await chunks.__anext__() == b'a' * 10
+
+    upstream.chunks.put(ConnectionError('upstream closed'))
+    thread.join()
+    assert [chunk async for chunk in chunks] == []
+    assert isinstance(download.error, ConnectionError)
+
+
+async def test_listener_after_discard_gets_empty_body(download, upstream):
+    thread = start(download)
+    upstream.chunks.put(ConnectionError('upstream closed'))
+    thread.join()
+    download.discard()
+    assert await read_body(download) == []
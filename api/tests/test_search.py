@@ -0,0 +1,36 @@
+import pytest
+
+from tracks.search import (
+    CATALOG_SOURCE, SEARCH_MAX_LIMIT, SEARCH_MAX_OFFSET, SPOTIFY_SOURCE,
+    decode_cursor, encode_cursor, next_cursor,
+)
+
+
+@pytest.mark.parametrize('source', [CATALOG_SOURCE, SPOTIFY_SOURCE])
+def test_cursor_round_trip(source):
+    assert decode_cursor(encode_cursor(source, 20, 10)) == (source, 20, 10)
+
+
+@pytest.mark.parametrize('cursor', [
+    '',
+    'not base64!',
+    encode_cursor('web', 0, 10),
+    encode_cursor(CATALOG_SOURCE, -10, 10),
+    encode_cursor(CATALOG_SOURCE, SEARCH_MAX_OFFSET + 10, 10),
+    encode_cursor(CATALOG_SOURCE, 0, 0),
+    encode_cursor(CATALOG_SOURCE, 0, SEARCH_MAX_LIMIT + 1),
+])
+def test_decode_cursor_rejects_invalid(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+
+def test_next_cursor_stays_on_source():
+    assert decode_cursor(next_cursor(CATALOG_SOURCE, 0, 10, True)) == (CATALOG_SOURCE, 10, 10)
+    assert decode_cursor(next_cursor(SPOTIFY_SOURCE, 0, 10, True)) == (SPOTIFY_SOURCE, 10, 10)
+
+
+def test_next_cursor_after_last_page():
+    assert next_cursor(SPOTIFY_SOURCE, 0, 10, False) is None
+    # every cursor handed out must be accepted back
+    assert next_cursor(CATALOG_SOURCE, SEARCH_MAX_OFFSET - 5, 10, True) is None
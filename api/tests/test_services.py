@@ -0,0 +1,152 @@
+from datetime import datetime, timezone
+
+import pytest
+
+import config
+from tracks.models import YoutubeResolution
+from tracks.services import MusicSearchService, YOUTUBE_WATCH_URL, normalize_recording
+from database import requires_database
+
+
+@pytest.mark.parametrize('artist, name, expected', [
+    ('Queen', 'Bohemian Rhapsody', 'queen - bohemian rhapsody'),
+    ('Queen', 'Bohemian Rhapsody - Remastered 2011', 'queen - bohemian rhapsody'),
+    ('Daft Punk', 'Get Lucky (feat. Pharrell Williams)', 'daft punk - get lucky'),
+    ('AC/DC', 'Back In  Black [with Someone] - Radio Edit', 'acdc - back in black'),
+    (None, None, '-'),
+])
+def test_normalize_recording(artist, name, expected):
+    assert normalize_recording(artist, name) == expected
+
+
+class Video:
+    def __init__(self, video_id: str):
+        self.video_id = video_id
+        self.watch_url = f'{YOUTUBE_WATCH_URL}{video_id}'
+
+
+class YoutubeStub:
+    """
+    Search result and playable videos of a recording,
+    downloads of other videos fail
+
+    """
+
+    def __init__(self, video_id: str, confidence: float, playable: set):
+        self.video = Video(video_id)
+        self.confidence = confidence
+        self.playable = playable
+        self.searches = 0
+        self.downloads = []
+
+    def match_youtube_video(self, query: str, duration_ms: int):
+        self.searches += 1
+        return self.video, duration_ms // 1000, self.confidence
+
+    def download_track(self, track_id: str, url: str) -> str:
+        self.downloads.append(url)
+        if url.removeprefix(YOUTUBE_WATCH_URL) not in self.playable:
+            raise ConnectionError('video unavailable')
+        return f'/media/{track_id}.mp3'
+
+
+@pytest.fixture
+def db(tables):
+    session = config.SessionLocal()
+    yield session
+    session.close()
+
+
+def make_service(monkeypatch, youtube: YoutubeStub) -> MusicSearchService:
+    service = MusicSearchService()
+    monkeypatch.setattr(service, 'match_youtube_video', youtube.match_youtube_video)
+    monkeypatch.setattr(service, 'download_track', youtube.download_track)
+    return service
+
+
+def resolved_videos(db) -> list[str]:
+    return [resolution.video_id for resolution in db.query(YoutubeResolution)]
+
+
+@requires_database
+def test_resolution_is_cached(db, monkeypatch):
+    youtube = YoutubeStub('good', confidence=0.9, playable={'good'})
+    service = make_service(monkeypatch, youtube)
+    for _ in range(2):
+        assert service.download_recording('t1', 'Queen', 'Bohemian Rhapsody', 354000, db)
+    assert youtube.searches == 1
+    assert resolved_videos(db) == ['good']
+
+
+@requires_database
+def test_failed_cached_video_is_resolved_again(db, monkeypatch):
+    db.add(YoutubeResolution(recording_key='queen - bohemian rhapsody', video_id='removed',
+                             confidence=1.0, created_at=datetime.now(timezone.utc)))
+    db.commit()
+    youtube = YoutubeStub('good', confidence=0.9, playable={'good'})
+    service = make_service(monkeypatch, youtube)
+
+    path = service.download_recording('t1', 'Queen', 'Bohemian Rhapsody', 354000, db)
+    assert path == '/media/t1.mp3'
+    assert youtube.downloads == [f'{YOUTUBE_WATCH_URL}removed', f'{YOUTUBE_WATCH_URL}good']
+    assert resolved_videos(db) == ['good']
+
+
+@requires_database
+@pytest.mark.parametrize('confidence', [0.2, None])
+def test_weak_match_is_not_saved(db, monkeypatch, confidence):
+    youtube = YoutubeStub('weak', confidence=confidence, playable={'weak'})
+    service = make_service(monkeypatch, youtube)
+    for _ in range(2):
+        service.download_recording('t1', 'Queen', 'Bohemian Rhapsody', 354000, db)
+    assert youtube.searches == 2
+    assert resolved_videos(db) == []
+
+
+class SpotifyStub:
+    def __init__(self, tracks: list = None, albums: list = None):
+        self.tracks_response = tracks
+        self.albums_response = albums
+
+    def tracks(self, track_ids):
+        return {'tracks': self.tracks_response}
+
+    def albums(self, album_ids):
+        return {'albums': self.albums_response}
+
+
+def spotify_track(track_id: str, **fields) -> dict:
+    return {'name': track_id, 'uri': f'spotify:track:{track_id}', 'artists': [],
+            'album': {'images': [{'url': f'https://i/{track_id}'}]}, **fields}
+
+
+def spotify_album(album_id: str, **fields) -> dict:
+    return {'name': album_id, 'uri': f'spotify:album:{album_id}', 'artists': [],
+            'images': [{'url': f'https://i/{album_id}'}], 'tracks': {'items': []}, **fields}
+
+
+def test_fetch_tracks_keeps_chunk_with_malformed_track(monkeypatch):
+    service = MusicSearchService()
+    monkeypatch.setattr(service, 'spotify', SpotifyStub(tracks=[
+        spotify_track('a'),
+        spotify_track('b', album={'images': []}),
+        spotify_track('c', artists=[None]),
+        None,
+    ]))
+    result = service.fetch_tracks(['a', 'b', 'c', 'd'])
+    assert result['a']['cover_url'] == 'https://i/a'
+    assert result['b']['cover_url'] is None
+    assert result['c'] is None and result['d'] is None
+    assert service.cache.get('track', 'detail_track:b') == result['b']
+    assert service.cache.get('track', 'detail_track:c') is None
+
+
+def test_fetch_albums_keeps_chunk_with_malformed_album(monkeypatch):
+    service = MusicSearchService()
+    monkeypatch.setattr(service, 'spotify', SpotifyStub(albums=[
+        spotify_album('a', images=None),
+        spotify_album('b', tracks=None),
+    ]))
+    result = service.fetch_albums(['a', 'b'])
+    assert result['a']['cover_url'] is None
+    assert result['b'] is None
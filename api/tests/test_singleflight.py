@@ -0,0 +1,88 @@
+import threading
+import time
+
+import pytest
+
+from tracks.singleflight import SingleFlight
+
+FOLLOWERS = 4
+
+
+class CountingEvent(threading.Event):
+    def __init__(self):
+        super().__init__()
+        self.waiters = 0
+        self.lock = threading.Lock()
+
+    def wait(self, timeout=None):
+        with self.lock:
+            self.waiters += 1
+        return super().wait(timeout)
+
+
+def wait_for(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, 'timed out'
+        time.sleep(0.01)
+
+
+# leader blocks in `func` until followers are waiting for its call, then finishes
+def run_concurrently(flight: SingleFlight, func):
+    release = threading.Event()
+    calls = []
+    results = []
+
+    def leader_func():
+        calls.append(1)
+        release.wait(5)
+        return func()
+
+    def call():
+        try:
+            results.append(flight.do('key', leader_func))
+        except Exception as e:
+            results.append(e)
+
+    leader = threading.Thread(target=call)
+    leader.start()
+    wait_for(lambda: 'key' in flight.calls)
+    done = flight.calls['key'].done = CountingEvent()
+
+    followers = [threading.Thread(target=call) for _ in range(FOLLOWERS)]
+    for thread in followers:
+        thread.start()
+    wait_for(lambda: done.waiters == FOLLOWERS)
+    release.set()
+    for thread in [leader, *followers]:
+        thread.join(5)
+    return calls, results
+
+
+def test_concurrent_calls_share_one_result():
+    flight = SingleFlight()
+    calls, results = run_concurrently(flight, lambda: 'track.mp3')
+    assert len(calls) == 1
+    assert results == ['track.mp3'] * (FOLLOWERS + 1)
+    assert flight.calls == {}
+
+
+def test_error_is_raised_to_every_caller():
+    flight = SingleFlight()
+    error = RuntimeError('download failed')
+
+    def fail():
+        raise error
+
+    calls, results = run_concurrently(flight, fail)
+    assert len(calls) == 1
+    assert results == [error] * (FOLLOWERS + 1)
+    assert flight.calls == {}
+
+
+def test_finished_call_is_not_reused():
+    flight = SingleFlight()
+    assert flight.do('key', lambda: 1) == 1
+    assert flight.do('key', lambda: 2) == 2
+    with pytest.raises(ValueError):
+        flight.do('key', lambda: int('x'))
@@ -0,0 +1,46 @@
+import pytest
+
+from tracks import spotify_session
+from tracks.spotify_session import TokenBucket
+from clock import FakeClock
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(spotify_session, 'time', clock)
+    return clock
+
+
+def test_burst_up_to_capacity_does_not_wait(clock):
+    bucket = TokenBucket(rate=2, capacity=3)
+    for _ in range(3):
+        bucket.acquire()
+    assert clock.slept == 0
+
+
+def test_requests_over_capacity_wait_for_rate(clock):
+    bucket = TokenBucket(rate=2, capacity=3)
+    for _ in range(5):
+        bucket.acquire()
+    assert clock.slept == pytest.approx(1.0)
+
+
+def test_tokens_refill_up_to_capacity(clock):
+    bucket = TokenBucket(rate=2, capacity=3)
+    for _ in range(3):
+        bucket.acquire()
+    clock.now += 60
+    for _ in range(3):
+        bucket.acquire()
+    assert clock.slept == 0
+    bucket.acquire()
+    assert clock.slept == pytest.approx(0.5)
+
+
+def test_pause_blocks_every_caller(clock):
+    bucket = TokenBucket(rate=2, capacity=3)
+    bucket.pause(5)
+    bucket.pause(1)
+    bucket.acquire()
+    assert clock.slept == pytest.approx(5)
@@ -0,0 +1,95 @@
+import os
+from collections import Counter
+
+import pytest
+
+import config
+from tracks.models import Track
+from tracks.storage import MediaStore
+from database import requires_database
+
+
+def test_files_are_sharded(tmp_path):
+    store = MediaStore(str(tmp_path))
+    path = store.path_for('abc')
+    shard = os.path.relpath(os.path.dirname(path), tmp_path)
+    assert os.path.basename(path) == 'abc.mp3'
+    assert [len(part) for part in shard.split(os.sep)] == [2, 2]
+
+
+def test_resolve_falls_back_to_unsharded_file(tmp_path):
+    store = MediaStore(str(tmp_path))
+    assert store.resolve('abc') == os.path.join(tmp_path, 'abc.mp3')
+    os.makedirs(store.shard_dir('abc'))
+    open(store.path_for('abc'), 'wb').close()
+    assert store.resolve('abc') == store.path_for('abc')
+
+
+class FailingSession:
+    def execute(self, statement):
+        raise RuntimeError('database is down')
+
+    def rollback(self):
+        pass
+
+
+def test_failed_flush_keeps_accesses(tmp_path):
+    store = MediaStore(str(tmp_path))
+    store.record_access('a')
+    store.record_access('a')
+    store.record_access('b')
+    with pytest.raises(RuntimeError):
+        store.flush_accesses(FailingSession())
+    store.record_access('a')
+    assert store.accesses == Counter({'a': 3, 'b': 1})
+    assert set(store.last_access) == {'a', 'b'}
+
+
+def add_track(db, tmp_path, track_id: str, play_count: int = 0, status: str = None) -> str:
+    path = os.path.join(tmp_path, f'{track_id}.mp3')
+    with open(path, 'wb') as file:
+        file.write(b'x' * 100)
+    db.add(Track(track_id=track_id, file_path=path, size_bytes=100, play_count=play_count,
+                 download_status=status))
+    db.commit()
+    return path
+
+
+@requires_database
+def test_flush_accesses_adds_play_counts(tables, tmp_path):
+    store = MediaStore(str(tmp_path))
+    db = config.SessionLocal()
+    try:
+        add_track(db, tmp_path, 'a', play_count=2)
+        store.record_access('a')
+        store.record_access('a')
+        store.flush_accesses(db)
+        track = db.query(Track).filter(Track.track_id == 'a').one()
+        assert track.play_count == 4
+        assert track.last_accessed_at is not None
+        assert store.accesses == Counter()
+    finally:
+        db.close()
+
+
+@requires_database
+def test_evict_removes_least_played_files_down_to_target(tables, tmp_path, monkeypatch):
+    monkeypatch.setattr(config, 'MEDIA_EVICTION_TARGET', 0.9)
+    store = MediaStore(str(tmp_path), quota_bytes=300)
+    db = config.SessionLocal()
+    try:
+        played = add_track(db, tmp_path, 'played', play_count=5)
+        unplayed = add_track(db, tmp_path, 'unplayed')
+        once = add_track(db, tmp_path, 'once', play_count=1)
+        downloading = add_track(db, tmp_path, 'downloading', status=Track.DOWNLOADING)
+
+        # 400 bytes used, down to 270, downloading tracks are kept
+        assert store.evict(db) == 2
+        evicted = {track.track_id for track in db.query(Track).filter(Track.evicted.is_(True))}
+        assert evicted == {'unplayed', 'once'}
+        assert [os.path.exists(path) for path in (played, unplayed, once, downloading)] == [
+            True, False, False, True]
+        assert store.used_bytes(db) == 200
+        assert store.evict(db) == 0
+    finally:
+        db.close()
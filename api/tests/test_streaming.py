@@ -0,0 +1,72 @@
+import os
+
+import pytest
+from fastapi import FastAPI, HTTPException
+
+from accounts.schemas import TokenUser
+from tracks import routes
+from tracks.storage import MediaStore
+from tracks.streaming import parse_range
+from asgi import call
+
+
+@pytest.mark.parametrize('header, expected', [
+    ('bytes=0-99', (0, 99)),
+    ('bytes=100-', (100, 999)),
+    ('bytes=-100', (900, 999)),
+    ('bytes=-5000', (0, 999)),
+    ('bytes=900-5000', (900, 999)),
+    ('bytes = 10 - 20', (10, 20)),
+])
+def test_parse_range(header, expected):
+    assert parse_range(header, 1000) == expected
+
+
+@pytest.mark.parametrize('header', ['bytes=-', 'bytes=0-9,20-29', 'items=0-9', 'bytes=a-b'])
+def test_parse_range_unsupported_sends_whole_file(header):
+    assert parse_range(header, 1000) is None
+
+
+@pytest.mark.parametrize('header', ['bytes=1000-', 'bytes=50-10'])
+def test_parse_range_not_satisfiable(header):
+    with pytest.raises(HTTPException) as error:
+        parse_range(header, 1000)
+    assert error.value.status_code == 416
+    assert error.value.headers['Content-Range'] == 'bytes */1000'
+
+
+class MusicServiceStub:
+    def __init__(self, media_store: MediaStore):
+        self.media_store = media_store
+
+
+@pytest.fixture
+def media_app(monkeypatch, tmp_path):
+    media_store = MediaStore(str(tmp_path))
+    path = media_store.path_for('abc')
+    os.makedirs(os.path.dirname(path))
+    with open(path, 'wb') as file:
+        file.write(b'x' * 100)
+    monkeypatch.setattr(routes, 'get_music_service', lambda: MusicServiceStub(media_store))
+
+    app = FastAPI()
+    app.include_router(routes.router, prefix='/tracks')
+    route = next(route for route in routes.router.routes if route.path == '/media/{track_id}')
+    authenticate = route.dependant.dependencies[0].call
+    app.dependency_overrides[authenticate] = lambda: TokenUser(
+        id=1, username='alice', token_version=0)
+    return app, media_store
+
+
+@pytest.mark.anyio
+async def test_head_media_sends_headers_only(media_app):
+    app, media_store = media_app
+    messages = await call(app, 'HEAD', '/tracks/media/abc')
+    assert messages[0]['status'] == 200
+    assert dict(messages[0]['headers'])[b'content-length'] == b'100'
+    assert [message['body'] for message in messages[1:]] == [b'']
+    assert media_store.accesses['abc'] == 0
+
+    messages = await call(app, 'GET', '/tracks/media/abc')
+    assert b''.join(message.get('body', b'') for message in messages[1:]) == b'x' * 100
+    assert media_store.accesses['abc'] == 1
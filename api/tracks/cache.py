@@ -0,0 +1,204 @@
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+
+import config
+
+
+def normalize_query(query: str) -> str:
+    return re.sub(r'\s+', ' ', query).strip().lower()
+
+
+# spotify:track:<id>, https://open.spotify.com/track/<id>?si=... and bare ids give the same key
+def normalize_uri(uri: str) -> str:
+    uri = uri.strip()
+    if uri.startswith('http'):
+        uri = uri.split('?')[0].rstrip('/')
+    return re.split(r'[:/]', uri)[-1]
+
+
+class MemoryCacheBackend:
+    """
+    In-process LRU storage, bounded by number of entries
+
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def get(self, key: str):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[2] < time.time():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return entry[0], entry[1]
+
+    def set(self, key: str, value, stored_at: float, expires_in: float):
+        with self.lock:
+            self.entries[key] = (value, stored_at, stored_at + expires_in)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: str):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class RedisCacheBackend:
+    """
+    Storage shared between workers. Size limit and LRU eviction
+    are left to redis (maxmemory + allkeys-lru policy)
+
+    """
+
+    def __init__(self, url: str, prefix: str = 'music-api:cache:'):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self.evictions = 0
+
+    def get(self, key: str):
+        raw = self.client.get(self.prefix + key)
+        if raw is None:
+            return None
+        entry = json.loads(raw)
+        return entry['value'], entry['stored_at']
+
+    def set(self, key: str, value, stored_at: float, expires_in: float):
+        raw = json.dumps({'value': value, 'stored_at': stored_at})
+        self.client.set(self.prefix + key, raw, ex=max(int(expires_in), 1))
+
+    def delete(self, key: str):
+        self.client.delete(self.prefix + key)
+
+    def clear(self):
+        for key in self.client.scan_iter(f'{self.prefix}*'):
+            self.client.delete(key)
+
+
+def get_cache_backend():
+    if config.CACHE_BACKEND == 'redis':
+        return RedisCacheBackend(config.CACHE_REDIS_URL)
+    return MemoryCacheBackend(config.CACHE_MAX_ENTRIES)
+
+
+class MetadataCache:
+    """
+    TTL cache for Spotify metadata.
+    Entries older than their entity ttl are still served
+    for CACHE_STALE_SECONDS while being refreshed in background
+
+    """
+
+    def __init__(self, backend=None, ttls: dict = None, stale_seconds: int = None):
+        self.backend = backend or get_cache_backend()
+        self.ttls = ttls or config.CACHE_TTL_SECONDS
+        self.stale_seconds = (
+            config.CACHE_STALE_SECONDS if stale_seconds is None else stale_seconds)
+        self.hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+        self.refreshing = set()
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='cache-refresh')
+
+    def get_or_load(self, entity: str, key: str, loader):
+        ttl = self.ttls.get(entity, 0)
+        if ttl <= 0:
+            return loader()
+
+        key = f'{entity}:{key}'
+        entry = self.backend.get(key)
+        if entry is None:
+            with self.lock:
+                self.misses += 1
+            return self.load(key, ttl, loader)
+
+        value, stored_at = entry
+        with self.lock:
+            self.hits += 1
+            if time.time() - stored_at > ttl:
+                self.stale_hits += 1
+                if key not in self.refreshing:
+                    self.refreshing.add(key)
+                    self.executor.submit(self.refresh, key, ttl, loader)
+        return value
+
+    # plain lookup for batch requests, stale entries count as misses
+    def get(self, entity: str, key: str):
+        ttl = self.ttls.get(entity, 0)
+        entry = self.backend.get(f'{entity}:{key}') if ttl > 0 else None
+        with self.lock:
+            if entry is None or time.time() - entry[1] > ttl:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return entry[0]
+
+    # stores value fetched outside of get_or_load (e.g. from a batch request)
+    def put(self, entity: str, key: str, value):
+        ttl = self.ttls.get(entity, 0)
+        if ttl > 0:
+            self.backend.set(f'{entity}:{key}', value,
+                             stored_at=time.time(), expires_in=ttl + self.stale_seconds)
+
+    def load(self, key: str, ttl: int, loader):
+        value = loader()
+        self.backend.set(key, value, stored_at=time.time(), expires_in=ttl + self.stale_seconds)
+        return value
+
+    def refresh(self, key: str, ttl: int, loader):
+        try:
+            self.load(key, ttl, loader)
+        except Exception:
+            # stale value stays in place until it expires
+            pass
+        finally:
+            with self.lock:
+                self.refreshing.discard(key)
+
+    def stats(self) -> dict:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'stale_hits': self.stale_hits,
+            'evictions': self.backend.evictions,
+        }
+
+
+# caches service method result using instance `cache` attribute
+def cached(entity: str, normalize=normalize_uri):
+    def decorator(func):
+        param = func.__code__.co_varnames[1]
+
+        @wraps(func)
+        def wrapper(self, *args, **kwargs):
+            if args:
+                value, rest = args[0], args[1:]
+            else:
+                value, rest = kwargs[param], ()
+            parts = [normalize(value), *map(str, rest)]
+            parts += [f'{name}={kwargs[name]}' for name in sorted(kwargs) if name != param]
+            key = ':'.join([func.__name__, *parts])
+            return self.cache.get_or_load(
+                entity, key, lambda: func(self, *args, **kwargs))
+        return wrapper
+    return decorator
@@ -0,0 +1,142 @@
+import logging
+import queue
+import threading
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert
+
+import config
+from .cache import normalize_uri
+from .models import CatalogAlbum, CatalogArtist, CatalogTrack
+
+logger = logging.getLogger(__name__)
+
+CATALOG_MODELS = {
+    'track': CatalogTrack,
+    'album': CatalogAlbum,
+    'artist': CatalogArtist,
+}
+
+
+class Catalog:
+    """
+    Persistent copy of Spotify metadata that passed through MusicSearchService.
+    Writes are queued and upserted in batches by a background thread,
+    search answers from local full-text index when a full fresh page is found
+
+    """
+
+    def __init__(self):
+        self.enabled = config.CATALOG_ENABLED
+        self.search_enabled = config.CATALOG_ENABLED and config.CATALOG_SEARCH_ENABLED
+        self.max_age = timedelta(seconds=config.CATALOG_MAX_AGE)
+        self.queue = queue.Queue(maxsize=config.CATALOG_QUEUE_SIZE)
+        self.stopped = threading.Event()
+        self.thread = None
+
+    # items are in search result shape (see format_search_* of MusicSearchService)
+    def record(self, entity_type: str, items: list[dict]):
+        if not self.enabled:
+            return
+        for item in items:
+            try:
+                self.queue.put_nowait((entity_type, item))
+            except queue.Full:
+                return
+
+    def to_row(self, item: dict) -> dict:
+        uri = item.get('spotify_uri') or item.get('uri')
+        artists = ' '.join(artist.get('name') or '' for artist in item.get('artists', []))
+        return {
+            'spotify_id': normalize_uri(uri),
+            'name': item.get('name'),
+            'search_text': f'{item.get("name") or ""} {artists}'.strip(),
+            'data': item,
+            'updated_at': datetime.now(timezone.utc),
+        }
+
+    def write(self, batch: list[tuple[str, dict]]):
+        rows = {entity_type: {} for entity_type in CATALOG_MODELS}
+        for entity_type, item in batch:
+            if item.get('spotify_uri') or item.get('uri'):
+                row = self.to_row(item)
+                # one row per id, postgres rejects duplicates in a single upsert
+                rows[entity_type][row['spotify_id']] = row
+
+        db = config.SessionLocal()
+        try:
+            for entity_type, entity_rows in rows.items():
+                if not entity_rows:
+                    continue
+                statement = insert(CATALOG_MODELS[entity_type]).values(list(entity_rows.values()))
+                db.execute(statement.on_conflict_do_update(
+                    index_elements=['spotify_id'],
+                    set_={
+                        'name': statement.excluded.name,
+                        'search_text': statement.excluded.search_text,
+                        'data': statement.excluded.data,
+                        'updated_at': statement.excluded.updated_at,
+                    }
+                ))
+            db.commit()
+        finally:
+            db.close()
+
+    # (items, more rows follow), None when the page is left to spotify.
+    # `partial` accepts short and stale pages, when paging a result the catalog has started
+    def search(self, entity_type: str, query: str, limit: int, offset: int,
+               partial: bool = False):
+        model = CATALOG_MODELS[entity_type]
+        ts_query = func.websearch_to_tsquery('simple', query)
+        db = config.SessionLocal()
+        try:
+            rows = db.query(model.data, model.updated_at).filter(
+                model.search_vector.op('@@')(ts_query)
+            ).order_by(
+                func.ts_rank(model.search_vector, ts_query).desc(), model.name
+            ).offset(offset).limit(limit + 1).all()
+        finally:
+            db.close()
+
+        has_next = len(rows) > limit
+        rows = rows[:limit]
+        if partial:
+            return [row.data for row in rows], has_next
+        # partial pages and stale rows are answered by spotify
+        if len(rows) < limit:
+            return None
+        oldest_allowed = datetime.now(timezone.utc) - self.max_age
+        for row in rows:
+            updated_at = row.updated_at
+            if updated_at.tzinfo is None:
+                updated_at = updated_at.replace(tzinfo=timezone.utc)
+            if updated_at < oldest_allowed:
+                return None
+        return [row.data for row in rows], has_next
+
+    def loop(self):
+        while not self.stopped.is_set():
+            try:
+                batch = [self.queue.get(timeout=1)]
+            except queue.Empty:
+                continue
+            while len(batch) < config.CATALOG_BATCH_SIZE:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self.write(batch)
+            except Exception:
+                logger.exception('Catalog write failed')
+
+    def start(self):
+        if not self.enabled:
+            return
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self.loop, name='catalog', daemon=True)
+        self.thread.start()
+
+    def shutdown(self):
+        self.stopped.set()
@@ -0,0 +1,282 @@
+import asyncio
+import logging
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from fastapi import HTTPException, status
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import config
+from .models import DownloadJob, Track
+
+logger = logging.getLogger(__name__)
+
+
+class DownloadQueue:
+    """
+    Runs track downloads in a bounded pool of worker threads,
+    album/artist bulk downloads in a separate one.
+    Jobs are stored in db, so unfinished ones are resumed by another worker.
+    Jobs of this process get a heartbeat on `updated_at`, a job without one
+    for DOWNLOAD_LEASE_SECONDS belongs to a stopped worker
+
+    """
+
+    ACTIVE_STATUSES = (DownloadJob.QUEUED, DownloadJob.DOWNLOADING)
+
+    def __init__(self, music_service, workers: int = None, max_pending: int = None,
+                 bulk_workers: int = None, max_bulk_pending: int = None):
+        self.music_service = music_service
+        self.workers = workers or config.DOWNLOAD_WORKERS
+        self.bulk_workers = bulk_workers or config.BULK_DOWNLOAD_WORKERS
+        self.max_pending = max_pending or config.DOWNLOAD_QUEUE_SIZE
+        self.max_bulk_pending = max_bulk_pending or config.BULK_DOWNLOAD_QUEUE_SIZE
+        self.executor = None
+        self.bulk_executor = None
+        self.pending = 0
+        self.bulk_pending = 0
+        # ids of jobs queued or running in this process
+        self.jobs = set()
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.executor = ThreadPoolExecutor(
+            max_workers=self.workers, thread_name_prefix='download')
+        self.bulk_executor = ThreadPoolExecutor(
+            max_workers=self.bulk_workers, thread_name_prefix='bulk-download')
+        self.resume()
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self.loop, name='download-jobs', daemon=True)
+        self.thread.start()
+
+    def shutdown(self):
+        self.stopped.set()
+        for executor in (self.executor, self.bulk_executor):
+            if executor:
+                executor.shutdown(wait=False, cancel_futures=True)
+        self.executor = self.bulk_executor = None
+
+    # picks up jobs of stopped workers, taken in one statement,
+    # so workers resuming at the same time don't run a job twice
+    def resume(self):
+        db = config.SessionLocal()
+        try:
+            orphans = db.execute(
+                update(DownloadJob)
+                .where(
+                    DownloadJob.status.in_(self.ACTIVE_STATUSES),
+                    DownloadJob.updated_at
+                    < func.now() - timedelta(seconds=config.DOWNLOAD_LEASE_SECONDS),
+                )
+                .values(status=DownloadJob.QUEUED, updated_at=func.now())
+                .returning(DownloadJob.id, DownloadJob.bulk_id)
+                .execution_options(synchronize_session=False)
+            ).all()
+            db.commit()
+        finally:
+            db.close()
+        for job_id, bulk_id in orphans:
+            bulk = bulk_id is not None
+            self.reserve(1, force=True, bulk=bulk)
+            self.add_jobs([job_id])
+            executor = self.bulk_executor if bulk else self.executor
+            executor.submit(self.run, job_id, bulk=bulk)
+
+    def add_jobs(self, job_ids: list[str]):
+        with self.lock:
+            self.jobs.update(job_ids)
+
+    # touches jobs of this process, so other workers don't take them as orphans
+    def heartbeat(self):
+        with self.lock:
+            job_ids = list(self.jobs)
+        if not job_ids:
+            return
+        db = config.SessionLocal()
+        try:
+            db.execute(
+                update(DownloadJob)
+                .where(DownloadJob.id.in_(job_ids),
+                       DownloadJob.status.in_(self.ACTIVE_STATUSES))
+                .values(updated_at=func.now())
+                .execution_options(synchronize_session=False)
+            )
+            db.commit()
+        finally:
+            db.close()
+
+    # jobs of a worker that has stopped while this one was running are resumed too
+    def loop(self):
+        while not self.stopped.wait(config.DOWNLOAD_LEASE_SECONDS / 3):
+            try:
+                self.heartbeat()
+                self.resume()
+            except Exception:
+                logger.exception('Download jobs heartbeat failed')
+
+    # takes `count` places in the queue, all or none.
+    # bulk jobs have their own budget, an album can't fill the queue of single tracks
+    def reserve(self, count: int, force: bool = False, bulk: bool = False):
+        with self.lock:
+            pending, max_pending = self.pending, self.max_pending
+            if bulk:
+                pending, max_pending = self.bulk_pending, self.max_bulk_pending
+            if not force and pending + count > max_pending:
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail='Download queue is full, try again later.'
+                )
+            if bulk:
+                self.bulk_pending += count
+            else:
+                self.pending += count
+
+    def release(self, count: int, bulk: bool = False):
+        with self.lock:
+            if bulk:
+                self.bulk_pending -= count
+            else:
+                self.pending -= count
+
+    def submit(self, job_id: str, force: bool = False):
+        self.reserve(1, force=force)
+        self.add_jobs([job_id])
+        self.executor.submit(self.run, job_id)
+
+    def queue_depth(self) -> int:
+        return self.pending + self.bulk_pending
+
+    async def create_job(self, track_uri: str, user_id: int, db: AsyncSession) -> DownloadJob:
+        track_id = track_uri.split(':')[2]
+        result = await db.execute(select(Track).filter(Track.track_id == track_id))
+        track_in_db = result.scalars().first()
+        if track_in_db and not self.music_service.media_store.is_available(track_in_db):
+            track_in_db = None
+        if not track_in_db:
+            # the user already has this track on its way, no need for another job.
+            # jobs of other users are not shared, they can't be polled by this user;
+            # a new job joins the running download through SingleFlight and leases
+            result = await db.execute(select(DownloadJob).filter(
+                DownloadJob.track_id == track_id,
+                DownloadJob.user_id == user_id,
+                DownloadJob.status.in_(self.ACTIVE_STATUSES)
+            ))
+            active_job = result.scalars().first()
+            if active_job:
+                return active_job
+
+        job = DownloadJob(
+            id=uuid.uuid4().hex,
+            track_uri=track_uri,
+            track_id=track_id,
+            user_id=user_id,
+        )
+        if track_in_db:
+            job.status = DownloadJob.DONE
+            job.media_url = f'{config.BASE_URL}/tracks/media/{track_id}'
+        db.add(job)
+        await db.commit()
+
+        if job.status == DownloadJob.QUEUED:
+            try:
+                self.submit(job.id)
+            except HTTPException:
+                await db.delete(job)
+                await db.commit()
+                raise
+        return job
+
+    # one job per track of an album or artist top tracks. Metadata is fetched in batches,
+    # available tracks are found with one query and jobs are inserted in one statement
+    async def create_bulk(self, uri: str, user_id: int, db: AsyncSession) -> str:
+        tracks = await asyncio.to_thread(self.music_service.collection_tracks, uri)
+        tracks = {track['spotify_uri'].split(':')[2]: track for track in tracks}
+        result = await db.execute(select(Track).filter(Track.track_id.in_(list(tracks))))
+        available = {
+            track.track_id for track in result.scalars()
+            if self.music_service.media_store.is_available(track)
+        }
+
+        bulk_id = uuid.uuid4().hex
+        rows = []
+        queued = []
+        for track_id, track in tracks.items():
+            row = {
+                'id': uuid.uuid4().hex,
+                'bulk_id': bulk_id,
+                'track_uri': track['spotify_uri'],
+                'track_id': track_id,
+                'user_id': user_id,
+                'status': DownloadJob.QUEUED,
+                'media_url': None,
+            }
+            if track_id in available:
+                row['status'] = DownloadJob.DONE
+                row['media_url'] = f'{config.BASE_URL}/tracks/media/{track_id}'
+            else:
+                queued.append((row['id'], track))
+            rows.append(row)
+
+        self.reserve(len(queued), bulk=True)
+        try:
+            if rows:
+                await db.execute(insert(DownloadJob), rows)
+                await db.commit()
+        except Exception:
+            self.release(len(queued), bulk=True)
+            raise
+        self.add_jobs([job_id for job_id, _ in queued])
+        for job_id, track in queued:
+            self.bulk_executor.submit(self.run, job_id, track, bulk=True)
+        return bulk_id
+
+    # track_data skips the spotify lookup of the track, when it is known
+    def run(self, job_id: str, track_data: dict = None, bulk: bool = False):
+        db = config.SessionLocal()
+        try:
+            job = db.get(DownloadJob, job_id)
+            job.status = DownloadJob.DOWNLOADING
+            db.commit()
+            try:
+                track_url = self.music_service.listen_track(job.track_uri, db, track_data)
+                job.status = DownloadJob.DONE
+                job.media_url = f'{config.BASE_URL}{track_url}'
+            except Exception as e:
+                db.rollback()
+                job = db.get(DownloadJob, job_id)
+                job.status = DownloadJob.FAILED
+                job.error = str(e)
+            db.commit()
+        finally:
+            db.close()
+            with self.lock:
+                self.jobs.discard(job_id)
+            self.release(1, bulk=bulk)
+
+
+def serialize_job(job: DownloadJob) -> dict:
+    return {
+        'job_id': job.id,
+        'track_uri': job.track_uri,
+        'status': job.status,
+        'media_url': job.media_url,
+        'error': job.error,
+    }
+
+
+def serialize_bulk(bulk_id: str, jobs: list[DownloadJob]) -> dict:
+    counts = {status: 0 for status in (
+        DownloadJob.QUEUED, DownloadJob.DOWNLOADING, DownloadJob.DONE, DownloadJob.FAILED)}
+    for job in jobs:
+        counts[job.status] += 1
+    return {
+        'bulk_id': bulk_id,
+        'total': len(jobs),
+        **counts,
+        'jobs': [serialize_job(job) for job in jobs],
+    }
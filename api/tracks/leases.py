@@ -0,0 +1,136 @@
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import timedelta
+
+from sqlalchemy import func, or_, select, update
+from sqlalchemy.dialects.postgresql import insert
+
+import config
+from .models import Track
+
+logger = logging.getLogger(__name__)
+
+
+class HeldLease:
+    """
+    Lease kept alive by `DownloadLeases.hold`,
+    `lost` is set once another worker has taken it over
+
+    """
+
+    def __init__(self, track_id: str):
+        self.track_id = track_id
+        self.lost = False
+
+
+class DownloadLeases:
+    """
+    Claims on `tracks` rows shared by all workers and hosts using the same database,
+    so a track is downloaded by one of them at a time.
+    Lease expiry is compared to the database clock, hosts clocks may differ
+
+    """
+
+    def __init__(self, lease_seconds: int = None, poll_interval: float = None):
+        self.lease = timedelta(seconds=lease_seconds or config.DOWNLOAD_LEASE_SECONDS)
+        self.poll_interval = poll_interval or config.DOWNLOAD_LEASE_POLL_INTERVAL
+        self.owner = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+
+    # creates the row if needed, takes it unless another live lease holds it
+    def claim(self, track_id: str) -> bool:
+        expires_at = func.now() + self.lease
+        stmt = insert(Track).values(
+            track_id=track_id,
+            download_status=Track.DOWNLOADING,
+            download_owner=self.owner,
+            lease_expires_at=expires_at,
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['track_id'],
+            set_={
+                'download_status': Track.DOWNLOADING,
+                'download_owner': self.owner,
+                'lease_expires_at': expires_at,
+            },
+            where=or_(
+                Track.download_status.is_distinct_from(Track.DOWNLOADING),
+                Track.lease_expires_at < func.now(),
+            ),
+        ).returning(Track.id)
+        db = config.SessionLocal()
+        try:
+            claimed = db.execute(stmt).first() is not None
+            db.commit()
+            return claimed
+        finally:
+            db.close()
+
+    def renew(self, track_id: str) -> bool:
+        db = config.SessionLocal()
+        try:
+            result = db.execute(
+                update(Track)
+                .where(Track.track_id == track_id, Track.download_owner == self.owner)
+                .values(lease_expires_at=func.now() + self.lease)
+            )
+            db.commit()
+            return result.rowcount > 0
+        finally:
+            db.close()
+
+    def release(self, track_id: str, status: str):
+        db = config.SessionLocal()
+        try:
+            db.execute(
+                update(Track)
+                .where(Track.track_id == track_id, Track.download_owner == self.owner)
+                .values(download_status=status, download_owner=None, lease_expires_at=None)
+            )
+            db.commit()
+        finally:
+            db.close()
+
+    # blocks while another worker holds a live lease on the track
+    def wait(self, track_id: str):
+        db = config.SessionLocal()
+        try:
+            while True:
+                holding = db.execute(select(Track.id).where(
+                    Track.track_id == track_id,
+                    Track.download_status == Track.DOWNLOADING,
+                    Track.lease_expires_at >= func.now(),
+                )).first()
+                db.rollback()
+                if holding is None:
+                    return
+                time.sleep(self.poll_interval)
+        finally:
+            db.close()
+
+    # keeps the lease alive for the duration of the block, yields HeldLease
+    @contextmanager
+    def hold(self, track_id: str):
+        stopped = threading.Event()
+        lease = HeldLease(track_id)
+
+        def keep_alive():
+            while not stopped.wait(self.lease.total_seconds() / 3):
+                try:
+                    if not self.renew(track_id):
+                        lease.lost = True
+                        logger.warning('Download lease of %s was taken over', track_id)
+                        return
+                except Exception:
+                    logger.exception('Download lease renewal of %s failed', track_id)
+
+        thread = threading.Thread(target=keep_alive, name=f'lease-{track_id}', daemon=True)
+        thread.start()
+        try:
+            yield lease
+        finally:
+            stopped.set()
@@ -1,4 +1,10 @@
-from sqlalchemy import Column, Integer, String   # ForeignKey
+from datetime import datetime, timezone
+
+from sqlalchemy import (
+    BigInteger, Boolean, Column, Computed, DateTime, Float, ForeignKey, Index, Integer, String
+)
+from sqlalchemy.dialects.postgresql import JSONB, TSVECTOR
+from sqlalchemy.orm import declared_attr
 # from sqlalchemy.orm import relationship
 
 from config import Base
@@ -7,7 +13,101 @@ from config import Base
 class Track(Base):
     __tablename__ = 'tracks'
 
+    DOWNLOADING = 'downloading'
+    READY = 'ready'
+    FAILED = 'failed'
+
     id = Column(Integer, primary_key=True)
     name = Column(String)
     track_id = Column(String, unique=True)
     file_path = Column(String)
+    size_bytes = Column(BigInteger, default=0)
+    play_count = Column(Integer, default=0, nullable=False)
+    last_accessed_at = Column(DateTime)
+    evicted = Column(Boolean, default=False, nullable=False)
+    # download lease shared by all workers, see leases.DownloadLeases
+    download_status = Column(String)
+    download_owner = Column(String)
+    lease_expires_at = Column(DateTime(timezone=True))
+
+
+class DownloadJob(Base):
+    __tablename__ = 'download_jobs'
+
+    QUEUED = 'queued'
+    DOWNLOADING = 'downloading'
+    DONE = 'done'
+    FAILED = 'failed'
+
+    id = Column(String, primary_key=True)
+    # set for jobs created together by an album/artist bulk download
+    bulk_id = Column(String, index=True)
+    track_uri = Column(String)
+    track_id = Column(String, index=True)
+    user_id = Column(Integer, ForeignKey('users.id'))
+    status = Column(String, default=QUEUED, index=True)
+    media_url = Column(String)
+    error = Column(String)
+    # timezone aware, jobs are written through asyncpg which rejects aware values for naive columns
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+    updated_at = Column(
+        DateTime(timezone=True),
+        default=lambda: datetime.now(timezone.utc),
+        onupdate=lambda: datetime.now(timezone.utc))
+
+
+class YoutubeResolution(Base):
+    """
+    Spotify recording ("artist - title", normalized) to YouTube video mapping,
+    so each recording is searched on YouTube only once
+
+    """
+
+    __tablename__ = 'youtube_resolutions'
+
+    id = Column(Integer, primary_key=True)
+    recording_key = Column(String, unique=True, nullable=False)
+    video_id = Column(String, nullable=False)
+    spotify_duration_ms = Column(Integer)
+    youtube_duration_s = Column(Integer)
+    # 1.0 when durations match exactly, down to 0.0 at YOUTUBE_MAX_DURATION_DIFF
+    confidence = Column(Float)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
+
+
+class CatalogMixin:
+    """
+    Local copy of Spotify metadata, `data` holds the search result item as it is returned by api
+
+    """
+
+    spotify_id = Column(String, primary_key=True)
+    name = Column(String)
+    # name and artists names, source of full-text index
+    search_text = Column(String)
+    data = Column(JSONB)
+    updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), index=True)
+
+    @declared_attr
+    def search_vector(cls):
+        return Column(TSVECTOR, Computed(
+            "to_tsvector('simple', coalesce(search_text, ''))", persisted=True))
+
+    @declared_attr
+    def __table_args__(cls):
+        return (
+            Index(f'ix_{cls.__tablename__}_search_vector', 'search_vector',
+                  postgresql_using='gin'),
+        )
+
+
+class CatalogTrack(CatalogMixin, Base):
+    __tablename__ = 'catalog_tracks'
+
+
+class CatalogAlbum(CatalogMixin, Base):
+    __tablename__ = 'catalog_albums'
+
+
+class CatalogArtist(CatalogMixin, Base):
+    __tablename__ = 'catalog_artists'
@@ -0,0 +1,112 @@
+import logging
+import queue
+import threading
+from datetime import datetime, timezone
+
+import config
+from .models import Track
+
+logger = logging.getLogger(__name__)
+
+
+class Prefetcher:
+    """
+    Low priority background downloads of tracks users are likely to play next
+    (first tracks of viewed albums and artists top tracks).
+    Waits while user downloads are queued and stops after PREFETCH_DAILY_BUDGET downloads a day
+
+    """
+
+    def __init__(self, music_service, download_queue):
+        self.music_service = music_service
+        self.download_queue = download_queue
+        self.enabled = config.PREFETCH_ENABLED
+        self.tracks_count = config.PREFETCH_TRACKS
+        self.daily_budget = config.PREFETCH_DAILY_BUDGET
+        self.queue = queue.Queue(maxsize=config.PREFETCH_QUEUE_SIZE)
+        self.scheduled = set()
+        self.budget_day = None
+        self.downloaded_today = 0
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.threads = []
+
+    def schedule(self, track_uris: list[str]):
+        if not self.enabled:
+            return
+        for track_uri in track_uris[:self.tracks_count]:
+            if not track_uri:
+                continue
+            with self.lock:
+                if track_uri in self.scheduled:
+                    continue
+                self.scheduled.add(track_uri)
+            try:
+                self.queue.put_nowait(track_uri)
+            except queue.Full:
+                # prefetching is best effort, extra tracks are dropped
+                with self.lock:
+                    self.scheduled.discard(track_uri)
+                return
+
+    def schedule_album(self, album: dict):
+        self.schedule([track.get('spotify_uri') for track in album.get('tracks', [])])
+
+    def schedule_artist(self, artist: dict):
+        self.schedule([track.get('spotify_uri') for track in artist.get('top_tracks', [])])
+
+    def take_budget(self) -> bool:
+        with self.lock:
+            today = datetime.now(timezone.utc).date()
+            if self.budget_day != today:
+                self.budget_day = today
+                self.downloaded_today = 0
+            if self.downloaded_today >= self.daily_budget:
+                return False
+            self.downloaded_today += 1
+            return True
+
+    def prefetch(self, track_uri: str):
+        db = config.SessionLocal()
+        try:
+            track_id = track_uri.split(':')[2]
+            track = db.query(Track).filter(Track.track_id == track_id).first()
+            if track and self.music_service.media_store.is_available(track):
+                return
+            if not self.take_budget():
+                return
+            self.music_service.listen_track(track_uri, db)
+        finally:
+            db.close()
+
+    def worker(self):
+        while not self.stopped.is_set():
+            try:
+                track_uri = self.queue.get(timeout=1)
+            except queue.Empty:
+                continue
+            # user requested downloads go first
+            while self.download_queue.queue_depth() > 0 and not self.stopped.wait(1):
+                pass
+            try:
+                if not self.stopped.is_set():
+                    self.prefetch(track_uri)
+            except Exception:
+                logger.exception('Prefetch of %s failed', track_uri)
+            finally:
+                with self.lock:
+                    self.scheduled.discard(track_uri)
+
+    def start(self):
+        if not self.enabled:
+            return
+        self.stopped.clear()
+        self.threads = [
+            threading.Thread(target=self.worker, name=f'prefetch-{i}', daemon=True)
+            for i in range(config.PREFETCH_WORKERS)
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def shutdown(self):
+        self.stopped.set()
@@ -0,0 +1,116 @@
+import asyncio
+import os
+import threading
+import uuid
+
+import anyio
+
+import config
+import metrics
+
+
+class ProgressiveDownload:
+    """
+    Writes YouTube audio stream to `<path>.part` and moves it to `path` when finished.
+    Listeners read the part file while it grows, so playback starts after the first chunk
+
+    """
+
+    def __init__(self, path: str, url: str, filesize: int = None, mime_type: str = None):
+        self.path = path
+        # unique, a worker taking over an expired lease must not write into the same file
+        self.part_path = f'{path}.{uuid.uuid4().hex[:8]}.part'
+        self.url = url
+        self.filesize = filesize
+        self.mime_type = mime_type or 'audio/mpeg'
+        self.bytes_written = 0
+        self.done = False
+        self.error = None
+        # set once the part file exists or the download has failed
+        self.started = threading.Event()
+
+    def run(self) -> str:
+        from pytubefix import request
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        try:
+            with open(self.part_path, 'wb') as file, metrics.track_upstream('youtube', 'download'):
+                self.started.set()
+                for chunk in request.stream(self.url):
+                    file.write(chunk)
+                    file.flush()
+                    self.bytes_written += len(chunk)
+            os.replace(self.part_path, self.path)
+        except Exception as e:
+            self.error = e
+            raise
+        finally:
+            self.done = True
+            self.started.set()
+        return self.path
+
+    # removes part file of a failed download, call after it is unregistered.
+    # listeners which have opened it already keep reading their handle
+    def discard(self):
+        try:
+            os.remove(self.part_path)
+        except FileNotFoundError:
+            pass
+
+    async def open(self):
+        # part file could be renamed between lookup and open
+        try:
+            return await anyio.open_file(self.part_path, 'rb')
+        except FileNotFoundError:
+            return await anyio.open_file(self.path, 'rb')
+
+    # yields file content as it is being written, reads run in a worker thread
+    async def iter_chunks(self):
+        try:
+            file = await self.open()
+        except FileNotFoundError:
+            # failed download has removed its part file
+            return
+        async with file:
+            position = 0
+            while True:
+                if self.error is not None:
+                    # truncated body tells the player the download has failed
+                    return
+                # read before bytes_written, so the last chunk is not missed
+                done = self.done
+                available = self.bytes_written - position
+                if available > 0:
+                    chunk = await file.read(min(available, config.MEDIA_CHUNK_SIZE))
+                    if not chunk:
+                        return
+                    position += len(chunk)
+                    metrics.MEDIA_BYTES_SERVED.labels('progressive').inc(len(chunk))
+                    yield chunk
+                elif done:
+                    return
+                else:
+                    await asyncio.sleep(config.PROGRESSIVE_POLL_INTERVAL)
+
+
+class ProgressiveRegistry:
+    """
+    Downloads in progress in this process, by track_id
+
+    """
+
+    def __init__(self):
+        self.downloads = {}
+        self.lock = threading.Lock()
+
+    def register(self, track_id: str, download: ProgressiveDownload):
+        with self.lock:
+            self.downloads[track_id] = download
+
+    def remove(self, track_id: str):
+        with self.lock:
+            self.downloads.pop(track_id, None)
+
+    def get(self, track_id: str):
+        with self.lock:
+            return self.downloads.get(track_id)
@@ -1,20 +1,60 @@
+import asyncio
+import re
+from functools import cache, wraps
 from typing import Annotated
-from fastapi import FastAPI, HTTPException, status, Depends
-from fastapi.responses import JSONResponse, FileResponse
-from fastapi.staticfiles import StaticFiles
-from requests.exceptions import HTTPError
-from sqlalchemy.orm import Session
-from functools import wraps
-
-from accounts.models import User
+import orjson
+from fastapi import APIRouter, HTTPException, Query, Request, Response, status, Depends
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from accounts.schemas import TokenUser
 from accounts.services import JWTService
 import config
-from .services import MusicSearchService
+from .schemas import (
+    BatchDetailItem, BatchDetailRequest, BulkDownloadStatus, DownloadJobStatus, EntityDetail,
+    SearchTrack,
+)
+from .search import SEARCH_TYPES, SEARCH_LIMIT, SEARCH_MAX_LIMIT, SEARCH_MAX_OFFSET, decode_cursor
+from .streaming import stream_media
+
+router = APIRouter()
+
+TRACK_ID_RE = re.compile(r'^[A-Za-z0-9]+$')
+
+
+# services, jobs and models are imported and built on first use (or in app lifespan),
+# not when routes are imported: they load requests, spotipy and the postgres dialect
+@cache
+def get_music_service():
+    from .services import MusicSearchService
+
+    return MusicSearchService()
+
+
+@cache
+def get_download_queue():
+    from .jobs import DownloadQueue
+
+    return DownloadQueue(get_music_service())
+
+
+@cache
+def get_prefetcher():
+    from .prefetch import Prefetcher
+
+    return Prefetcher(get_music_service(), get_download_queue())
+
 
-app = FastAPI()
-music_service = MusicSearchService()
+# exception types are looked up when an exception is being matched
+def http_error() -> type:
+    from requests.exceptions import HTTPError
+    return HTTPError
 
-app.mount("/media", StaticFiles(directory=config.MEDIA_DIR), name="media")
+
+def spotify_exception() -> type:
+    from spotipy.exceptions import SpotifyException
+    return SpotifyException
 
 
 def handle_errors(func):
@@ -22,7 +62,7 @@ def handle_errors(func):
     def wrapper(*args, **kwargs):
         try:
             return func(*args, **kwargs)
-        except HTTPError as e:
+        except http_error() as e:
             raise HTTPException(
                 status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
                 detail=f'Service is unavailable now. Reason: {e}'
@@ -34,24 +74,47 @@ def handle_errors(func):
             )
     return wrapper
 
-@app.get('/search/', tags=['tracks'])
-def search(query: str):
+@router.get('/search/', response_model=SearchTrack, response_model_exclude_unset=True,
+            tags=['tracks'])
+def search(query: str,
+           types: str = ','.join(SEARCH_TYPES),
+           limit: int = Query(SEARCH_LIMIT, ge=1, le=SEARCH_MAX_LIMIT),
+           offset: int = Query(0, ge=0, le=SEARCH_MAX_OFFSET),
+           cursor: str | None = None,
+           stream: bool = False):
     if not query:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail='Query is required.'
         )
 
-    result = {
-        'tracks': music_service.search_track(query),
-        'albums': music_service.search_album(query),
-        'artists': music_service.search_artist(query)
-    }
+    search_types = [t.strip() for t in types.split(',') if t.strip()]
+    if not search_types or any(t not in SEARCH_TYPES for t in search_types):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f'Invalid search types. Allowed: {", ".join(SEARCH_TYPES)}.'
+        )
 
-    return JSONResponse(result, status_code=status.HTTP_200_OK)
+    source = None
+    if cursor:
+        try:
+            source, offset, limit = decode_cursor(cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    music_service = get_music_service()
+    if stream:
+        lines = (
+            orjson.dumps(group) + b'\n'
+            for group in music_service.search_stream(query, search_types, limit, offset, source)
+        )
+        return StreamingResponse(lines, media_type='application/x-ndjson')
 
+    return music_service.search(query, types=search_types, limit=limit, offset=offset,
+                                source=source)
 
-@app.get('/detail/', tags=['tracks'])
+
+@router.get('/detail/', response_model=EntityDetail, tags=['tracks'])
 @handle_errors
 def detail_entity(entity_type: str, uri: str):
     if not entity_type:
@@ -61,25 +124,165 @@ def detail_entity(entity_type: str, uri: str):
         )
 
     if entity_type == 'track':
-        return music_service.detail_track(track_uri=uri)
+        return get_music_service().detail_track(track_uri=uri)
     elif entity_type == 'album':
-        return music_service.detail_album(album_uri=uri)
+        album = get_music_service().detail_album(album_uri=uri)
+        get_prefetcher().schedule_album(album)
+        return album
     elif entity_type == 'artist':
-        return music_service.detail_artist(artist_uri=uri)
+        artist = get_music_service().detail_artist(artist_uri=uri)
+        get_prefetcher().schedule_artist(artist)
+        return artist
     else:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail='Invalid entity type.'
         )
 
-@app.post('/download-track/', tags=['tracks'])
-def load_track(track_uri: str,
-               current_user: Annotated[User,
-                                       Depends(JWTService().get_current_user)],
-               db: Session = Depends(config.get_db)):
-    return f'{config.BASE_URL}{music_service.listen_track(track_uri, db)}'
 
+@router.post('/detail/batch/', response_model=list[BatchDetailItem],
+             response_model_exclude_unset=True, tags=['tracks'])
+@handle_errors
+def detail_batch(request: BatchDetailRequest):
+    return get_music_service().detail_batch(request.uris)
+
+
+@router.post('/download-track/', response_model=DownloadJobStatus,
+             status_code=status.HTTP_202_ACCEPTED, tags=['tracks'])
+async def load_track(track_uri: str,
+                     response: Response,
+                     current_user: Annotated[TokenUser,
+                                             Depends(JWTService().get_token_user)],
+                     db: AsyncSession = Depends(config.get_async_db)):
+    from .jobs import serialize_job
+    from .models import DownloadJob
+
+    job = await get_download_queue().create_job(track_uri, user_id=current_user.id, db=db)
+    if job.status == DownloadJob.DONE:
+        response.status_code = status.HTTP_200_OK
+    return serialize_job(job)
+
+
+@router.get('/download-jobs/{job_id}', response_model=DownloadJobStatus, tags=['tracks'])
+async def download_job_status(job_id: str,
+                              current_user: Annotated[TokenUser,
+                                                      Depends(JWTService().get_token_user)],
+                              db: AsyncSession = Depends(config.get_async_db)):
+    from .jobs import serialize_job
+    from .models import DownloadJob
+
+    job = await db.get(DownloadJob, job_id)
+    if job is None or job.user_id != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail='Download job is not found.'
+        )
+    return serialize_job(job)
+
+
+async def load_bulk(bulk_id: str, user_id: int, db: AsyncSession) -> dict:
+    from .jobs import serialize_bulk
+    from .models import DownloadJob
+
+    result = await db.execute(select(DownloadJob).filter(
+        DownloadJob.bulk_id == bulk_id, DownloadJob.user_id == user_id
+    ).order_by(DownloadJob.created_at, DownloadJob.id))
+    jobs = result.scalars().all()
+    if not jobs:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail='Bulk download is not found.'
+        )
+    return serialize_bulk(bulk_id, jobs)
+
+
+# downloads all tracks of an album, or artist top tracks
+@router.post('/download-bulk/', response_model=BulkDownloadStatus,
+             status_code=status.HTTP_202_ACCEPTED, tags=['tracks'])
+async def load_bulk_tracks(uri: str,
+                           current_user: Annotated[TokenUser,
+                                                   Depends(JWTService().get_token_user)],
+                           db: AsyncSession = Depends(config.get_async_db)):
+    try:
+        bulk_id = await get_download_queue().create_bulk(uri, user_id=current_user.id, db=db)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except spotify_exception() as e:
+        # unknown or malformed album/artist id, other spotify errors are not the client's fault
+        if e.http_status == status.HTTP_404_NOT_FOUND:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=e.msg)
+        if e.http_status == status.HTTP_400_BAD_REQUEST:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=e.msg)
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f'Service is unavailable now. Reason: {e.msg}'
+        )
+    return await load_bulk(bulk_id, current_user.id, db)
+
+
+@router.get('/download-bulks/{bulk_id}', response_model=BulkDownloadStatus, tags=['tracks'])
+async def bulk_download_status(bulk_id: str,
+                               current_user: Annotated[TokenUser,
+                                                       Depends(JWTService().get_token_user)],
+                               db: AsyncSession = Depends(config.get_async_db)):
+    return await load_bulk(bulk_id, current_user.id, db)
+
+
+# starts playback of a track that may still be downloading
+@router.get('/stream/', tags=['tracks'])
+async def stream_track(track_uri: str, request: Request,
+                       current_user: Annotated[TokenUser,
+                                               Depends(JWTService().get_token_user)],
+                       db: AsyncSession = Depends(config.get_async_db)):
+    from .models import DownloadJob
 
-@app.get('/media/{track_id}', tags=['tracks'])
-def get_track(track_id: str, current_user: Annotated[User, Depends(JWTService().get_current_user)]):
-    return FileResponse(f'{config.MEDIA_DIR}\\{track_id}.mp3')
+    music_service = get_music_service()
+    job = await get_download_queue().create_job(track_uri, user_id=current_user.id, db=db)
+    track_id = job.track_id
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + config.PROGRESSIVE_START_TIMEOUT
+    while job.status != DownloadJob.DONE:
+        download = music_service.progressive.get(track_id)
+        # headers are sent only once the part file exists, failures before it are reported
+        if download is not None and download.started.is_set():
+            if download.error is not None:
+                raise HTTPException(
+                    status_code=status.HTTP_502_BAD_GATEWAY,
+                    detail=f'Track download failed: {download.error}'
+                )
+            headers = {}
+            if download.filesize:
+                headers['content-length'] = str(download.filesize)
+            return StreamingResponse(download.iter_chunks(), media_type=download.mime_type,
+                                     headers=headers)
+        if job.status == DownloadJob.FAILED:
+            raise HTTPException(
+                status_code=status.HTTP_502_BAD_GATEWAY,
+                detail=f'Track download failed: {job.error}'
+            )
+        if loop.time() > deadline:
+            raise HTTPException(
+                status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+                detail='Track download has not started yet, try again later.'
+            )
+        await asyncio.sleep(config.PROGRESSIVE_POLL_INTERVAL)
+        await db.refresh(job)
+
+    music_service.media_store.record_access(track_id)
+    return stream_media(request, music_service.media_store.resolve(track_id))
+
+
+@router.api_route('/media/{track_id}', methods=['GET', 'HEAD'], tags=['tracks'])
+def get_track(track_id: str, request: Request,
+              current_user: Annotated[TokenUser, Depends(JWTService().get_token_user)]):
+    if not TRACK_ID_RE.match(track_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail='Track file is not found.'
+        )
+    media_store = get_music_service().media_store
+    # HEAD requests and later ranges of the same playback are not counted as plays
+    if request.method == 'GET' and (
+            'range' not in request.headers or request.headers['range'].startswith('bytes=0-')):
+        media_store.record_access(track_id)
+    return stream_media(request, media_store.resolve(track_id))
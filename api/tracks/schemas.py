@@ -1,7 +1,110 @@
-from pydantic import BaseModel
+from typing import Literal
 
+from pydantic import BaseModel, Field
 
+import config
+
+
+class ArtistRef(BaseModel):
+    name: str | None
+    uri: str | None
+
+
+class SearchTrackItem(BaseModel):
+    entity_type: Literal['track']
+    name: str | None
+    artists: list[ArtistRef]
+    cover_url: str | None
+    duration_ms: int | None
+    spotify_uri: str | None
+
+
+class SearchAlbumItem(BaseModel):
+    entity_type: Literal['album']
+    uri: str | None
+    name: str | None
+    artists: list[ArtistRef]
+    total_tracks: int | None
+    cover_url: str | None
+    release_date: str | None
+
+
+class SearchArtistItem(BaseModel):
+    entity_type: Literal['artist']
+    name: str | None
+    uri: str | None
+    image: str | None
+    genres: list[str] | None
+
+
+# groups are present only for requested search types
 class SearchTrack(BaseModel):
-    tracks: dict
-    albums: dict
-    artists: dict
+    tracks: list[SearchTrackItem] = []
+    albums: list[SearchAlbumItem] = []
+    artists: list[SearchArtistItem] = []
+    next_cursor: str | None = None
+
+
+class AlbumTrack(BaseModel):
+    name: str | None
+    duration_ms: int | None
+    spotify_uri: str | None
+
+
+class TrackDetail(BaseModel):
+    name: str | None
+    artists: list[ArtistRef]
+    cover_url: str | None
+    duration_ms: int | None
+    spotify_uri: str | None
+
+
+class AlbumDetail(BaseModel):
+    uri: str | None
+    name: str | None
+    artists: list[ArtistRef]
+    total_tracks: int | None
+    cover_url: str | None
+    release_date: str | None
+    tracks: list[AlbumTrack]
+
+
+class ArtistDetail(BaseModel):
+    name: str | None
+    uri: str | None
+    image: str | None
+    genres: list[str] | None
+    top_tracks: list[AlbumTrack]
+    albums: list[AlbumDetail]
+
+
+EntityDetail = TrackDetail | AlbumDetail | ArtistDetail
+
+
+class BatchDetailRequest(BaseModel):
+    uris: list[str] = Field(min_length=1, max_length=config.BATCH_DETAIL_MAX_URIS)
+
+
+class BatchDetailItem(BaseModel):
+    uri: str
+    entity_type: str | None = None
+    data: EntityDetail | None = None
+    error: str | None = None
+
+
+class DownloadJobStatus(BaseModel):
+    job_id: str
+    track_uri: str
+    status: Literal['queued', 'downloading', 'done', 'failed']
+    media_url: str | None
+    error: str | None
+
+
+class BulkDownloadStatus(BaseModel):
+    bulk_id: str
+    total: int
+    queued: int
+    downloading: int
+    done: int
+    failed: int
+    jobs: list[DownloadJobStatus]
@@ -0,0 +1,40 @@
+import base64
+
+# search parameters and pagination cursors, routes use them without loading the services
+SEARCH_TYPES = ['track', 'album', 'artist']
+SEARCH_GROUPS = {'track': 'tracks', 'album': 'albums', 'artist': 'artists'}
+# spotify search page size limits
+SEARCH_LIMIT = 10
+SEARCH_MAX_LIMIT = 50
+SEARCH_MAX_OFFSET = 1000
+# a search is paged from the source which answered its first page
+CATALOG_SOURCE = 'catalog'
+SPOTIFY_SOURCE = 'spotify'
+SEARCH_SOURCES = (CATALOG_SOURCE, SPOTIFY_SOURCE)
+
+
+# opaque pagination token for /tracks/search/
+def encode_cursor(source: str, offset: int, limit: int) -> str:
+    raw = f'{source}:{offset}:{limit}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> tuple[str, int, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        source, offset, limit = raw.split(':')
+        offset, limit = int(offset), int(limit)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError('Invalid cursor.')
+    if source not in SEARCH_SOURCES:
+        raise ValueError('Invalid cursor.')
+    if not 0 <= offset <= SEARCH_MAX_OFFSET or not 1 <= limit <= SEARCH_MAX_LIMIT:
+        raise ValueError('Invalid cursor.')
+    return source, offset, limit
+
+
+# cursor of the following page, None after the last one or past SEARCH_MAX_OFFSET
+def next_cursor(source: str, offset: int, limit: int, has_next: bool) -> str | None:
+    if not has_next or offset + limit > SEARCH_MAX_OFFSET:
+        return None
+    return encode_cursor(source, offset + limit, limit)
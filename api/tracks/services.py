@@ -1,11 +1,70 @@
-import spotipy
-from spotipy.oauth2 import SpotifyClientCredentials
-from pytubefix import YouTube, Search
+import logging
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
 
 import config
-from .models import Track
+import metrics
+from .catalog import Catalog
+from .leases import DownloadLeases
+from .cache import MetadataCache, cached, normalize_query, normalize_uri
+from .models import Track, YoutubeResolution
+from .progressive import ProgressiveDownload, ProgressiveRegistry
+from .search import (
+    CATALOG_SOURCE, SEARCH_GROUPS, SEARCH_LIMIT, SEARCH_TYPES, SPOTIFY_SOURCE, next_cursor,
+)
+from .singleflight import SingleFlight
+from .storage import MediaStore
+
+# max ids accepted by spotify multiple tracks/albums endpoints
+TRACKS_BATCH_SIZE = 50
+ALBUMS_BATCH_SIZE = 20
+# spotify album tracks page size limit
+ALBUM_TRACKS_LIMIT = 50
+# raised by format_* on missing or null fields of a spotify object
+FORMAT_ERRORS = (AttributeError, IndexError, KeyError, TypeError)
+
+SPOTIFY_URI_RE = re.compile(
+    r'^(?:spotify:|https?://open\.spotify\.com/(?:intl-[\w-]+/)?)'
+    r'(?P<entity_type>track|album|artist)[:/](?P<id>[A-Za-z0-9]+)'
+)
+
+
+# spotify:album:<id> or https://open.spotify.com/album/<id> -> ('album', '<id>')
+def parse_spotify_uri(uri: str) -> tuple[str, str]:
+    match = SPOTIFY_URI_RE.match(uri.strip())
+    if not match:
+        raise ValueError('Invalid Spotify uri.')
+    return match.group('entity_type'), match.group('id')
+
+
+YOUTUBE_WATCH_URL = 'https://www.youtube.com/watch?v='
+# parts of spotify titles that differ between releases of the same recording
+RECORDING_NOISE_RE = re.compile(
+    r'\s*[\(\[](feat\.?|ft\.?|with)\s[^\)\]]*[\)\]]'
+    r'|\s+-\s+(\d{4}\s+)?(remaster(ed)?|single version|album version|radio edit)\b.*$',
+    re.IGNORECASE
+)
+
+
+# "Artist", "Song (feat. X) - Remastered 2011" -> "artist - song"
+def normalize_recording(artist: str, name: str) -> str:
+    name = RECORDING_NOISE_RE.sub('', name or '')
+    key = f'{artist or ""} - {name}'.lower()
+    key = re.sub(r'[^\w\s-]', '', key)
+    return re.sub(r'\s+', ' ', key).strip()
+
+
+logger = logging.getLogger(__name__)
+
+
+def chunked(items: list, size: int) -> list[list]:
+    return [items[i:i + size] for i in range(0, len(items), size)]
 
 
 class MusicSearchService:
@@ -16,12 +75,41 @@ class MusicSearchService:
 
     """
 
+    # spotipy and pytubefix are imported on first use, they are slow to import
     def __init__(self):
+        import spotipy
+        from spotipy.oauth2 import SpotifyClientCredentials
+
+        from .spotify_session import create_spotify_session
+
         self.client_id = config.CLIENT_ID
         self.secret = config.CLIENT_SECRET
+        self.session = create_spotify_session()
         self.auth_manager = SpotifyClientCredentials(
-            client_id=self.client_id, client_secret=self.secret)
-        self.spotify = spotipy.Spotify(auth_manager=self.auth_manager)
+            client_id=self.client_id, client_secret=self.secret,
+            requests_session=self.session, requests_timeout=config.SPOTIFY_TIMEOUT)
+        self.auth_manager.OAUTH_TOKEN_URL = config.SPOTIFY_TOKEN_URL
+        # retries are done by the session, so they share its rate limit
+        self.spotify = spotipy.Spotify(
+            auth_manager=self.auth_manager,
+            requests_session=self.session,
+            requests_timeout=config.SPOTIFY_TIMEOUT,
+            retries=0,
+            status_retries=0,
+        )
+        self.spotify.prefix = config.SPOTIFY_API_URL
+        self.cache = MetadataCache()
+        self.executor = ThreadPoolExecutor(
+            max_workers=config.SPOTIFY_MAX_WORKERS, thread_name_prefix='spotify')
+        # separate pool for batch fan-out, its tasks may wait on `executor`
+        self.batch_executor = ThreadPoolExecutor(
+            max_workers=config.SPOTIFY_MAX_WORKERS, thread_name_prefix='spotify-batch')
+        # single flight coalesces downloads within the process, leases across workers
+        self.downloads = SingleFlight()
+        self.leases = DownloadLeases()
+        self.progressive = ProgressiveRegistry()
+        self.media_store = MediaStore()
+        self.catalog = Catalog()
 
     # request for track data that the user wants to receive
     def search_by_query(self, query):
@@ -38,77 +126,189 @@ class MusicSearchService:
         return f'{author}-{title}'
 
     # searching youtube video that matches query
-    def get_youtube_url(self, query):
-        vids = Search(query)
-        # using [0] because in our case, we use the exact name of the track, so the error is minimal
-        video_url = vids.videos[0].watch_url
-        return video_url
+    # picks the result whose length is closest to the spotify one,
+    # returns (video, video length in seconds, confidence)
+    def match_youtube_video(self, query: str, duration_ms: int):
+        from pytubefix import Search
+
+        with metrics.track_upstream('youtube', 'search'):
+            videos = Search(query).videos[:config.YOUTUBE_MATCH_CANDIDATES]
+        if not duration_ms:
+            return videos[0], None, None
+
+        best, best_length, best_diff = videos[0], None, None
+        for video in videos:
+            try:
+                length = video.length
+            except Exception:
+                continue
+            diff = abs(length - duration_ms / 1000)
+            if best_diff is None or diff < best_diff:
+                best, best_length, best_diff = video, length, diff
+        if best_diff is None:
+            return best, None, None
+        return best, best_length, max(0.0, 1 - best_diff / config.YOUTUBE_MAX_DURATION_DIFF)
 
-    # downloading video audio from youtube
+    # searching youtube for a recording, matches below YOUTUBE_MIN_CONFIDENCE
+    # (or of unknown length) are used once but not saved to youtube_resolutions
+    def resolve_youtube_url(self, recording_key: str, artist: str, name: str,
+                            duration_ms: int, db: Session) -> str:
+        video, length, confidence = self.match_youtube_video(f'{artist} - {name}', duration_ms)
+        if confidence is not None and confidence >= config.YOUTUBE_MIN_CONFIDENCE:
+            db.execute(insert(YoutubeResolution).values(
+                recording_key=recording_key,
+                video_id=video.video_id,
+                spotify_duration_ms=duration_ms,
+                youtube_duration_s=length,
+                confidence=confidence,
+                created_at=datetime.now(timezone.utc),
+            ).on_conflict_do_nothing(index_elements=['recording_key']))
+            db.commit()
+        return video.watch_url
+
+    # downloads a recording from its youtube video, searched once and then taken
+    # from youtube_resolutions. A cached video that fails (removed, blocked)
+    # is forgotten and the recording is searched again
+    def download_recording(self, track_id: str, artist: str, name: str,
+                           duration_ms: int, db: Session) -> str:
+        recording_key = normalize_recording(artist, name)
+        resolution = db.query(YoutubeResolution).filter(
+            YoutubeResolution.recording_key == recording_key).first()
+        if resolution:
+            try:
+                return self.download_track(track_id, f'{YOUTUBE_WATCH_URL}{resolution.video_id}')
+            except Exception:
+                logger.warning('Cached video %s of %r failed, resolving again',
+                               resolution.video_id, recording_key, exc_info=True)
+                db.query(YoutubeResolution).filter(
+                    YoutubeResolution.id == resolution.id).delete()
+                db.commit()
+        url = self.resolve_youtube_url(recording_key, artist, name, duration_ms, db)
+        return self.download_track(track_id, url)
+
+    # downloading video audio from youtube,
+    # listeners can read the file while it is written through `progressive` registry
     def download_track(self, track_id: str, url: str):
-        yt = YouTube(url)
-        downloaded_file = yt.streams.get_audio_only().download(
-            output_path=config.MEDIA_DIR, filename=track_id, mp3=True)
-        if downloaded_file:
-            return downloaded_file
+        from pytubefix import YouTube
 
-    def search_track(self, query: str) -> list[dict]:
-        response = self.spotify.search(query, type='track')
-        tracks = response.get('tracks', {}).get('items', [])
+        with metrics.track_upstream('youtube', 'streams'):
+            stream = YouTube(url).streams.get_audio_only()
+        download = ProgressiveDownload(
+            path=self.media_store.path_for(track_id),
+            url=stream.url,
+            filesize=stream.filesize,
+            mime_type=stream.mime_type,
+        )
+        self.progressive.register(track_id, download)
+        try:
+            return download.run()
+        finally:
+            self.progressive.remove(track_id)
+            if download.error is not None:
+                download.discard()
 
-        result = []
-        for track in tracks:
-            track_data = {
-                'entity_type': 'track',
-                'name': track.get('name'),
-                'artists': [
-                    {'name': artist.get('name'), 'uri': artist.get('uri')}
-                    for artist in track.get('artists', [])
-                ],
-                'cover_url': track.get('album', {}).get('images', [{}])[0].get('url'),
-                'duration_ms': track.get('duration_ms'),
-                'spotify_uri': track.get('uri')
-            }
-            result.append(track_data)
+    def format_search_track(self, track: dict) -> dict:
+        return {
+            'entity_type': 'track',
+            'name': track.get('name'),
+            'artists': [
+                {'name': artist.get('name'), 'uri': artist.get('uri')}
+                for artist in track.get('artists', [])
+            ],
+            'cover_url': (track.get('album', {}).get('images') or [{}])[0].get('url'),
+            'duration_ms': track.get('duration_ms'),
+            'spotify_uri': track.get('uri')
+        }
 
-        return result
+    def format_search_album(self, album: dict) -> dict:
+        return {
+            'entity_type': 'album',
+            'uri': album.get('uri'),
+            'name': album.get('name'),
+            'artists': [
+                {'name': artist.get('name'), 'uri': artist.get('uri')}
+                for artist in album.get('artists', [])
+            ],
+            'total_tracks': album.get('total_tracks'),
+            'cover_url': (album.get('images') or [{}])[0].get('url'),
+            'release_date': album.get('release_date')
 
-    def search_album(self, query: str) -> list[dict]:
-        response = self.spotify.search(query, type='album')
-        albums = response.get('albums').get('items')[:1]
-        result = []
-        for album in albums:
-            album_data = {
-                'entity_type': 'album',
-                'uri': album.get('uri'),
-                'name': album.get('name'),
-                'artists': [
-                    {'name': artist.get('name'), 'uri': artist.get('uri')}
-                    for artist in album.get('artists', [])
-                ],
-                'total_tracks': album.get('total_tracks'),
-                'cover_url': album.get('images')[0].get('url'),
-                'release_date': album.get('release_date')
+        }
 
-            }
-            result.append(album_data)
+    def format_search_artist(self, artist: dict) -> dict:
+        return {
+            'entity_type': 'artist',
+            'name': artist.get('name'),
+            'uri': artist.get('uri'),
+            'image': (artist.get('images') or [{}])[0].get('url'),
+            'genres': artist.get('genres')
+        }
+
+    def search_track(self, query: str, limit: int = SEARCH_LIMIT, offset: int = 0) -> list[dict]:
+        return self.search(query, ['track'], limit, offset)['tracks']
+
+    def search_album(self, query: str, limit: int = SEARCH_LIMIT, offset: int = 0) -> list[dict]:
+        return self.search(query, ['album'], limit, offset)['albums']
+
+    def search_artist(self, query: str, limit: int = SEARCH_LIMIT, offset: int = 0) -> list[dict]:
+        return self.search(query, ['artist'], limit, offset)['artists']
+
+    # one multi-type request to Spotify instead of a call per entity type.
+    # `source` of the cursor keeps the following pages on the catalog or on Spotify
+    @cached('search', normalize=normalize_query)
+    def search(self, query: str, types: list[str] = SEARCH_TYPES,
+               limit: int = SEARCH_LIMIT, offset: int = 0, source: str = None) -> dict:
+        if self.catalog.search_enabled and source != SPOTIFY_SOURCE:
+            partial = source == CATALOG_SOURCE
+            result = self.search_catalog(query, types, limit, offset, partial)
+            if result is not None:
+                return result
+
+        response = self.spotify.search(query, limit=limit, offset=offset, type=','.join(types))
+        result = {}
+        has_next = False
+        for entity_type in types:
+            group = SEARCH_GROUPS[entity_type]
+            page = response.get(group) or {}
+            format_item = getattr(self, f'format_search_{entity_type}')
+            result[group] = [format_item(item) for item in page.get('items', []) if item]
+            self.catalog.record(entity_type, result[group])
+            has_next = has_next or bool(page.get('next'))
+        result['next_cursor'] = next_cursor(SPOTIFY_SOURCE, offset, limit, has_next)
         return result
 
-    def search_artist(self, query: str) -> list[dict]:
-        response = self.spotify.search(query, type='artist')
-        artists = response.get('artists').get('items')
-        result = []
-        for artist in artists:
-            artist_data = {
-                'entity_type': 'artist',
-                'name': artist.get('name'),
-                'uri': artist.get('uri'),
-                'image': artist.get('images')[0].get('url'),
-                'genres': artist.get('genres')
-            }
-            result.append(artist_data)
+    # answers from local catalog, None when any group is missing or stale there
+    def search_catalog(self, query: str, types: list[str], limit: int, offset: int,
+                       partial: bool = False):
+        result = {}
+        has_next = False
+        try:
+            for entity_type in types:
+                page = self.catalog.search(entity_type, query, limit, offset, partial)
+                if page is None:
+                    return None
+                result[SEARCH_GROUPS[entity_type]], more = page
+                has_next = has_next or more
+        except Exception:
+            logger.exception('Catalog search failed')
+            return None
+        result['next_cursor'] = next_cursor(CATALOG_SOURCE, offset, limit, has_next)
         return result
 
+    # one request per type, each group is yielded as soon as its response arrives
+    def search_stream(self, query: str, types: list[str] = SEARCH_TYPES,
+                      limit: int = SEARCH_LIMIT, offset: int = 0, source: str = None):
+        futures = {
+            self.executor.submit(
+                self.search, query, [entity_type], limit, offset, source): entity_type
+            for entity_type in types
+        }
+        for future in as_completed(futures):
+            try:
+                yield future.result()
+            except Exception as e:
+                yield {SEARCH_GROUPS[futures[future]]: [], 'error': str(e)}
+
     def detail_album_tracks(self, tracks: list) -> list:
         result = []
         for track in tracks:
@@ -120,8 +320,7 @@ class MusicSearchService:
             result.append(track_data)
         return result
 
-    def detail_album(self, album_uri: str) -> dict:
-        response = self.spotify.album(album_uri)
+    def format_album(self, response: dict) -> dict:
         album_data = {
             'uri': response.get('uri'),
             'name': response.get('name'),
@@ -130,31 +329,69 @@ class MusicSearchService:
                 for artist in response.get('artists', [])
             ],
             'total_tracks': response.get('total_tracks'),
-            'cover_url': response.get('images')[0].get('url'),
-            'release_date': response.get('release_data')
+            'cover_url': (response.get('images') or [{}])[0].get('url'),
+            'release_date': response.get('release_date')
 
         }
         tracks = self.detail_album_tracks(response.get('tracks').get('items'))
         album_data['tracks'] = tracks
         return album_data
 
+    # album detail without tracks is a search result item
+    def record_album(self, album_data: dict):
+        item = {'entity_type': 'album'}
+        item.update({key: album_data.get(key) for key in (
+            'uri', 'name', 'artists', 'total_tracks', 'cover_url', 'release_date')})
+        self.catalog.record('album', [item])
+
+    @cached('album')
+    def detail_album(self, album_uri: str) -> dict:
+        response = self.spotify.album(album_uri)
+        album_data = self.format_album(response)
+        self.record_album(album_data)
+        return album_data
+
+    # up to ALBUMS_BATCH_SIZE albums in one request, {album_id: album_data or None}.
+    # a malformed album is left out, the rest of the chunk is kept
+    def fetch_albums(self, album_ids: list[str]) -> dict:
+        response = self.spotify.albums(album_ids)
+        result = {}
+        for album_id, album in zip(album_ids, response.get('albums')):
+            result[album_id] = None
+            if album is not None:
+                try:
+                    result[album_id] = self.format_album(album)
+                except FORMAT_ERRORS:
+                    logger.exception('Malformed album %s', album_id)
+                    continue
+                self.cache.put('album', f'detail_album:{album_id}', result[album_id])
+                self.record_album(result[album_id])
+        return result
+
+    # full album objects for many uris, ALBUMS_BATCH_SIZE per request, chunks fetched concurrently
+    def detail_albums(self, album_uris: list[str]) -> list[dict]:
+        album_ids = [normalize_uri(uri) for uri in album_uris]
+        result = []
+        for albums in self.executor.map(self.fetch_albums, chunked(album_ids, ALBUMS_BATCH_SIZE)):
+            result.extend(album for album in albums.values() if album is not None)
+        return result
+
+    @cached('artist')
     def detail_artist_albums(self, artist_uri: str) -> list[dict]:
         response = self.spotify.artist_albums(artist_uri, limit=50)
         albums = response.get('items')
-        result = []
-        for album in albums:
-            uri = album.get('uri')
-            result.append(self.detail_album(uri))
-        return result
+        return self.detail_albums([album.get('uri') for album in albums])
 
+    @cached('artist')
     def detail_artist(self, artist_uri: str) -> dict:
         response = self.spotify.artist(artist_id=artist_uri)
         artist_data = {
             'name': response.get('name'),
             'uri': response.get('uri'),
-            'image': response.get('images')[0].get('url'),
+            'image': (response.get('images') or [{}])[0].get('url'),
             'genres': response.get('genres')
         }
+        self.catalog.record('artist', [{'entity_type': 'artist', **artist_data}])
         top_tracks = self.spotify.artist_top_tracks(artist_uri, country='UA').get('tracks')
         result = self.detail_album_tracks(top_tracks)
         artist_data['top_tracks'] = result
@@ -162,43 +399,187 @@ class MusicSearchService:
         artist_data['albums'] = albums
         return artist_data
 
-    def detail_track(self, track_uri: str) -> dict:
-        track = self.spotify.track(track_id=track_uri)
-        track_data = {
+    def format_track(self, track: dict) -> dict:
+        return {
             'name': track.get('name'),
             'artists': [
                 {'name': artist.get('name'), 'uri': artist.get('uri')}
                 for artist in track.get('artists', [])
             ],
-            'cover_url': track.get('album', {}).get('images', [{}])[0].get('url'),
+            'cover_url': ((track.get('album') or {}).get('images') or [{}])[0].get('url'),
             'duration_ms': track.get('duration_ms'),
             'spotify_uri': track.get('uri')
         }
+
+    @cached('track')
+    def detail_track(self, track_uri: str) -> dict:
+        track = self.spotify.track(track_id=track_uri)
+        track_data = self.format_track(track)
+        self.catalog.record('track', [{'entity_type': 'track', **track_data}])
         return track_data
 
+    # up to TRACKS_BATCH_SIZE tracks in one request, {track_id: track_data or None}.
+    # a malformed track is left out, the rest of the chunk is kept
+    def fetch_tracks(self, track_ids: list[str]) -> dict:
+        response = self.spotify.tracks(track_ids)
+        result = {}
+        for track_id, track in zip(track_ids, response.get('tracks')):
+            result[track_id] = None
+            if track is not None:
+                try:
+                    result[track_id] = self.format_track(track)
+                except FORMAT_ERRORS:
+                    logger.exception('Malformed track %s', track_id)
+                    continue
+                self.cache.put('track', f'detail_track:{track_id}', result[track_id])
+                self.catalog.record('track', [{'entity_type': 'track', **result[track_id]}])
+        return result
+
+    # track details of an album or of artist top tracks, for bulk downloads.
+    # album tracks are completed with artists from cache or TRACKS_BATCH_SIZE per request
+    def collection_tracks(self, uri: str) -> list[dict]:
+        entity_type, entity_id = parse_spotify_uri(uri)
+        if entity_type == 'artist':
+            top_tracks = self.spotify.artist_top_tracks(entity_id, country='UA').get('tracks')
+            tracks = [self.format_track(track) for track in top_tracks]
+            for track in tracks:
+                track_key = f'detail_track:{normalize_uri(track["spotify_uri"])}'
+                self.cache.put('track', track_key, track)
+            self.catalog.record('track', [{'entity_type': 'track', **track} for track in tracks])
+            return tracks
+        if entity_type != 'album':
+            raise ValueError('Only album and artist uris can be downloaded in bulk.')
+
+        # album detail has the first page of tracks, the rest is requested page by page
+        album = self.detail_album(entity_id)
+        album_tracks = list(album['tracks'])
+        while len(album_tracks) < (album.get('total_tracks') or 0):
+            page = self.spotify.album_tracks(
+                entity_id, limit=ALBUM_TRACKS_LIMIT, offset=len(album_tracks))
+            if not page.get('items'):
+                break
+            album_tracks.extend(self.detail_album_tracks(page['items']))
+        track_ids = [
+            normalize_uri(track['spotify_uri'])
+            for track in album_tracks if track.get('spotify_uri')
+        ]
+        found = {}
+        pending = []
+        for track_id in track_ids:
+            data = self.cache.get('track', f'detail_track:{track_id}')
+            if data is not None:
+                found[track_id] = data
+            else:
+                pending.append(track_id)
+        chunks = chunked(pending, TRACKS_BATCH_SIZE)
+        for fetched in self.batch_executor.map(self.fetch_tracks, chunks):
+            found.update(fetched)
+        return [found[track_id] for track_id in track_ids if found.get(track_id)]
+
+    # details for mixed track/album/artist uris, in input order with per item errors
+    def detail_batch(self, uris: list[str]) -> list[dict]:
+        entities = []
+        for uri in uris:
+            try:
+                entities.append(parse_spotify_uri(uri))
+            except ValueError:
+                entities.append(None)
+
+        found = {}
+        pending = {entity_type: [] for entity_type in SEARCH_TYPES}
+        for entity in dict.fromkeys(entity for entity in entities if entity):
+            entity_type, entity_id = entity
+            data = self.cache.get(entity_type, f'detail_{entity_type}:{entity_id}')
+            if data is not None:
+                found[entity] = data
+            else:
+                pending[entity_type].append(entity_id)
+
+        calls = []
+        for chunk in chunked(pending['track'], TRACKS_BATCH_SIZE):
+            calls.append(('track', chunk, self.batch_executor.submit(self.fetch_tracks, chunk)))
+        for chunk in chunked(pending['album'], ALBUMS_BATCH_SIZE):
+            calls.append(('album', chunk, self.batch_executor.submit(self.fetch_albums, chunk)))
+        # artist details are built from several endpoints, so they are fetched one by one
+        for artist_id in pending['artist']:
+            future = self.batch_executor.submit(
+                lambda artist_id: {artist_id: self.detail_artist(artist_id)}, artist_id)
+            calls.append(('artist', [artist_id], future))
+
+        errors = {}
+        for entity_type, entity_ids, future in calls:
+            try:
+                fetched = future.result()
+            except Exception as e:
+                errors.update({(entity_type, entity_id): str(e) for entity_id in entity_ids})
+                continue
+            for entity_id in entity_ids:
+                if fetched.get(entity_id) is not None:
+                    found[(entity_type, entity_id)] = fetched[entity_id]
+
+        result = []
+        for uri, entity in zip(uris, entities):
+            if entity is None:
+                result.append({'uri': uri, 'error': 'Invalid Spotify uri.'})
+            elif entity in found:
+                result.append({'uri': uri, 'entity_type': entity[0], 'data': found[entity]})
+            else:
+                result.append({'uri': uri, 'entity_type': entity[0],
+                               'error': errors.get(entity, 'Not found.')})
+        return result
+
+    # downloads track and saves it to db, called once per track_id at a time
+    # track_data is detail_track() result, when the caller already has it
+    def fetch_track(self, track_uri: str, track_id: str, db: Session,
+                    track_data: dict = None) -> Track:
+        # another worker may be downloading it, then its result is used
+        while not self.leases.claim(track_id):
+            self.leases.wait(track_id)
+            track_in_db = db.query(Track).populate_existing().filter(
+                Track.track_id == track_id).first()
+            if track_in_db and self.media_store.is_available(track_in_db):
+                return track_in_db
+
+        status = Track.FAILED
+        try:
+            with self.leases.hold(track_id) as lease:
+                # a previous download could have finished between our lookup and the claim
+                track = db.query(Track).populate_existing().filter(
+                    Track.track_id == track_id).first()
+                if self.media_store.is_available(track):
+                    status = Track.READY
+                    return track
+
+                track_data = track_data or self.detail_track(track_uri)
+                name = track_data.get('name')
+                artist = track_data.get('artists')[0].get('name')
+                dowload_query = f'{artist} - {name}'
+                file_path = self.download_recording(
+                    track_id, artist, name, track_data.get('duration_ms'), db)
+                if lease.lost:
+                    # the worker which has taken the lease over writes the row
+                    return track
+                try:
+                    # evicted tracks keep their row and get the file back
+                    track.name = dowload_query
+                    track.file_path = file_path
+                    track.size_bytes = os.path.getsize(file_path)
+                    track.evicted = False
+                    db.commit()
+                except (IntegrityError, ValueError):
+                    db.rollback()
+                    raise
+                status = Track.READY
+                return track
+        finally:
+            self.leases.release(track_id, status)
+
     # returns url to listen track
-    def listen_track(self, track_uri: str, db: Session) -> str:
-        track_data = self.spotify.track(track_uri)
+    def listen_track(self, track_uri: str, db: Session, track_data: dict = None) -> str:
         track_id = track_uri.split(':')[2]
         track_in_db = db.query(Track).filter(Track.track_id == track_id).first()
-        if not track_in_db:
-            name = track_data.get('name')
-            artist = track_data.get('artists')[0].get('name')
-            dowload_query = f'{artist} - {name}'
-            file_path = self.download_track(
-                track_id=track_id,
-                url=self.get_youtube_url(dowload_query)
-            )
-            try:
-                track = Track(
-                    name=dowload_query,
-                    track_id=track_id,
-                    file_path=file_path
-                )
-                db.add(track)
-                db.commit()
-            except (IntegrityError, ValueError):
-                db.rollback()
-                raise
+        if not track_in_db or not self.media_store.is_available(track_in_db):
+            self.downloads.do(
+                track_id, lambda: self.fetch_track(track_uri, track_id, db, track_data))
         track_url = f'/tracks/media/{track_id}'
         return track_url
@@ -0,0 +1,136 @@
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import config
+import metrics
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+# https://api.spotify.com/v1/artists/<id>/top-tracks -> artists/top-tracks
+def spotify_operation(url: str) -> str:
+    parts = [part for part in urlsplit(url).path.split('/') if part]
+    if parts and parts[0] == 'v1':
+        parts = parts[1:]
+    if parts[-1:] == ['token']:
+        return 'token'
+    return '/'.join(parts[:1] + parts[2:3]) or 'unknown'
+
+
+class TokenBucket:
+    """
+    Process wide request budget: `rate` requests per second with bursts up to `capacity`.
+    pause() makes every caller wait, used when Spotify answers 429
+
+    """
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated_at = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if now >= self.blocked_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = max(self.blocked_until - now, (1 - self.tokens) / self.rate)
+            time.sleep(wait)
+
+    def pause(self, seconds: float):
+        with self.lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+
+class SpotifySession(requests.Session):
+    """
+    Keep-alive connection pool for Spotify API with timeouts
+    and retries (jittered backoff, Retry-After) that draw from a shared TokenBucket
+
+    """
+
+    def __init__(self, rate_limiter: TokenBucket, pool_size: int, timeout: float,
+                 retries: int, backoff: float, max_retry_after: float):
+        super().__init__()
+        self.rate_limiter = rate_limiter
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_retry_after = max_retry_after
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.mount('https://', adapter)
+        self.mount('http://', adapter)
+
+    def backoff_delay(self, attempt: int) -> float:
+        # full jitter
+        return random.uniform(0, self.backoff * 2 ** attempt)
+
+    def retry_after(self, response: requests.Response):
+        try:
+            return float(response.headers.get('Retry-After'))
+        except (TypeError, ValueError):
+            return None
+
+    # timing includes retries and rate limiter waits, as seen by the caller
+    def request(self, method, url, **kwargs):
+        operation = spotify_operation(url)
+        with metrics.track_upstream('spotify', operation):
+            response = self.request_with_retries(method, url, **kwargs)
+        if response.status_code >= 400:
+            metrics.UPSTREAM_ERRORS.labels('spotify', operation).inc()
+        return response
+
+    def request_with_retries(self, method, url, **kwargs):
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = self.timeout
+        for attempt in range(self.retries + 1):
+            last_attempt = attempt == self.retries
+            self.rate_limiter.acquire()
+            try:
+                response = super().request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                if last_attempt:
+                    raise
+                time.sleep(self.backoff_delay(attempt))
+                continue
+
+            if response.status_code not in RETRY_STATUSES or last_attempt:
+                return response
+
+            delay = self.retry_after(response)
+            if delay is None:
+                delay = self.backoff_delay(attempt)
+            elif delay > self.max_retry_after:
+                # not worth holding the request, let the caller fail now
+                return response
+            if response.status_code == 429:
+                self.rate_limiter.pause(delay)
+            response.close()
+            time.sleep(delay)
+        return response
+
+
+spotify_rate_limiter = TokenBucket(rate=config.SPOTIFY_RATE_LIMIT, capacity=config.SPOTIFY_BURST)
+
+
+def create_spotify_session() -> SpotifySession:
+    return SpotifySession(
+        rate_limiter=spotify_rate_limiter,
+        pool_size=config.SPOTIFY_POOL_SIZE,
+        timeout=config.SPOTIFY_TIMEOUT,
+        retries=config.SPOTIFY_RETRIES,
+        backoff=config.SPOTIFY_BACKOFF,
+        max_retry_after=config.SPOTIFY_MAX_RETRY_AFTER,
+    )
@@ -0,0 +1,144 @@
+import hashlib
+import logging
+import os
+import threading
+from collections import Counter
+from datetime import datetime, timezone
+
+from sqlalchemy import func, update
+
+import config
+from .models import Track
+
+logger = logging.getLogger(__name__)
+
+
+class MediaStore:
+    """
+    Keeps downloaded tracks in hash-sharded subdirectories of MEDIA_DIR
+    and evicts least frequently played files once MEDIA_QUOTA_BYTES is exceeded
+
+    """
+
+    def __init__(self, media_dir: str = None, quota_bytes: int = None):
+        self.media_dir = media_dir or config.MEDIA_DIR
+        self.quota_bytes = config.MEDIA_QUOTA_BYTES if quota_bytes is None else quota_bytes
+        self.accesses = Counter()
+        self.last_access = {}
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = None
+
+    # media/3f/a2/<track_id>.mp3
+    def shard_dir(self, track_id: str) -> str:
+        digest = hashlib.sha1(track_id.encode()).hexdigest()
+        return os.path.join(self.media_dir, digest[:2], digest[2:4])
+
+    def path_for(self, track_id: str) -> str:
+        return os.path.join(self.shard_dir(track_id), f'{track_id}.mp3')
+
+    # files downloaded before sharding stay in the root of MEDIA_DIR
+    def resolve(self, track_id: str) -> str:
+        path = self.path_for(track_id)
+        if os.path.exists(path):
+            return path
+        return os.path.join(self.media_dir, f'{track_id}.mp3')
+
+    def is_available(self, track: Track) -> bool:
+        return (not track.evicted
+                and track.file_path is not None
+                and os.path.exists(track.file_path))
+
+    # counters are kept in memory and written to db by the eviction thread
+    def record_access(self, track_id: str):
+        with self.lock:
+            self.accesses[track_id] += 1
+            self.last_access[track_id] = datetime.now(timezone.utc)
+
+    def flush_accesses(self, db):
+        with self.lock:
+            accesses, self.accesses = self.accesses, Counter()
+            last_access, self.last_access = self.last_access, {}
+        try:
+            for track_id, count in accesses.items():
+                db.execute(
+                    update(Track)
+                    .where(Track.track_id == track_id)
+                    .values(play_count=Track.play_count + count,
+                            last_accessed_at=last_access[track_id])
+                )
+            db.commit()
+        except Exception:
+            db.rollback()
+            # kept for the next flush, accesses recorded meanwhile are newer
+            with self.lock:
+                self.accesses.update(accesses)
+                for track_id, accessed_at in last_access.items():
+                    self.last_access.setdefault(track_id, accessed_at)
+            raise
+
+    def used_bytes(self, db) -> int:
+        return db.query(func.coalesce(func.sum(Track.size_bytes), 0)).filter(
+            Track.evicted.is_(False)).scalar()
+
+    # removes least played (then least recently played) files
+    # until usage drops below MEDIA_EVICTION_TARGET of the quota
+    def evict(self, db) -> int:
+        if not self.quota_bytes:
+            return 0
+        used = self.used_bytes(db)
+        if used <= self.quota_bytes:
+            return 0
+
+        target = self.quota_bytes * config.MEDIA_EVICTION_TARGET
+        candidates = db.query(Track).filter(
+            Track.evicted.is_(False),
+            Track.download_status.is_distinct_from(Track.DOWNLOADING),
+        ).order_by(
+            Track.play_count.asc(),
+            Track.last_accessed_at.asc().nulls_first(),
+        ).yield_per(100)
+
+        evicted = 0
+        for track in candidates:
+            if used <= target:
+                break
+            if track.file_path:
+                try:
+                    os.remove(track.file_path)
+                except FileNotFoundError:
+                    pass
+            used -= track.size_bytes or 0
+            track.evicted = True
+            track.file_path = None
+            track.size_bytes = 0
+            evicted += 1
+        db.commit()
+        return evicted
+
+    def run_maintenance(self):
+        db = config.SessionLocal()
+        try:
+            self.flush_accesses(db)
+            self.evict(db)
+        finally:
+            db.close()
+
+    def loop(self):
+        while not self.stopped.wait(config.MEDIA_EVICTION_INTERVAL):
+            try:
+                self.run_maintenance()
+            except Exception:
+                logger.exception('Media store maintenance failed')
+
+    def start(self):
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self.loop, name='media-store', daemon=True)
+        self.thread.start()
+
+    def shutdown(self):
+        self.stopped.set()
+        try:
+            self.run_maintenance()
+        except Exception:
+            logger.exception('Media store maintenance failed')
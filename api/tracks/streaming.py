@@ -0,0 +1,143 @@
+import os
+import re
+import stat
+from email.utils import formatdate, parsedate_to_datetime
+
+import anyio
+from fastapi import HTTPException, Request, status
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+import config
+import metrics
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class MediaFileResponse(Response):
+    """
+    Sends [start, end] byte range of a file,
+    using zero-copy sendfile when the server supports it
+
+    """
+
+    def __init__(self, path: str, start: int, end: int, status_code: int,
+                 headers: dict, media_type: str):
+        super().__init__(status_code=status_code, headers=headers, media_type=media_type)
+        self.path = path
+        self.start = start
+        self.count = end - start + 1
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        await send({
+            'type': 'http.response.start',
+            'status': self.status_code,
+            'headers': self.raw_headers,
+        })
+        if scope['method'].upper() == 'HEAD' or self.count <= 0:
+            await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+            return
+
+        async with await anyio.open_file(self.path, mode='rb') as file:
+            if 'http.response.zerocopysend' in scope.get('extensions', {}):
+                await send({
+                    'type': 'http.response.zerocopysend',
+                    'file': file.wrapped.fileno(),
+                    'offset': self.start,
+                    'count': self.count,
+                    'more_body': False,
+                })
+                metrics.MEDIA_BYTES_SERVED.labels('file').inc(self.count)
+                return
+
+            await file.seek(self.start)
+            remaining = self.count
+            while remaining > 0:
+                chunk = await file.read(min(config.MEDIA_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                metrics.MEDIA_BYTES_SERVED.labels('file').inc(len(chunk))
+                await send({
+                    'type': 'http.response.body',
+                    'body': chunk,
+                    'more_body': remaining > 0,
+                })
+            if remaining > 0:
+                await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+
+
+def parse_range(range_header: str, size: int):
+    match = RANGE_RE.match(range_header.replace(' ', ''))
+    if not match or match.groups() == ('', ''):
+        # multiple ranges and other units are not supported, whole file is sent instead
+        return None
+    first, last = match.groups()
+    if first == '':
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise HTTPException(
+            status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            detail='Requested range is not satisfiable.',
+            headers={'Content-Range': f'bytes */{size}'}
+        )
+    return start, end
+
+
+def not_modified(request: Request, etag: str, mtime: float) -> bool:
+    if_none_match = request.headers.get('if-none-match')
+    if if_none_match is not None:
+        tags = [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]
+        return etag in tags or '*' in tags
+
+    if_modified_since = request.headers.get('if-modified-since')
+    if if_modified_since:
+        try:
+            return int(mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+# file response with ETag/Last-Modified validation and Range support
+def stream_media(request: Request, path: str, media_type: str = 'audio/mpeg') -> Response:
+    try:
+        file_stat = os.stat(path)
+    except FileNotFoundError:
+        file_stat = None
+    if file_stat is None or not stat.S_ISREG(file_stat.st_mode):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail='Track file is not found.'
+        )
+
+    size = file_stat.st_size
+    etag = f'"{int(file_stat.st_mtime):x}-{size:x}"'
+    headers = {
+        'accept-ranges': 'bytes',
+        'etag': etag,
+        'last-modified': formatdate(file_stat.st_mtime, usegmt=True),
+        'cache-control': f'private, max-age={config.MEDIA_MAX_AGE}',
+    }
+
+    if not_modified(request, etag, file_stat.st_mtime):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    byte_range = None
+    range_header = request.headers.get('range')
+    if_range = request.headers.get('if-range')
+    if range_header and (if_range is None or if_range == etag):
+        byte_range = parse_range(range_header, size)
+
+    if byte_range is None:
+        start, end, status_code = 0, size - 1, status.HTTP_200_OK
+    else:
+        start, end = byte_range
+        status_code = status.HTTP_206_PARTIAL_CONTENT
+        headers['content-range'] = f'bytes {start}-{end}/{size}'
+    headers['content-length'] = str(end - start + 1)
+
+    return MediaFileResponse(path, start, end, status_code, headers, media_type)
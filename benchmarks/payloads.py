@@ -0,0 +1,133 @@
+"""
+Spotify shaped payloads for the fake upstream.
+Generated deterministically from ids, or replayed from BENCH_PAYLOADS_DIR/<kind>.json when present
+
+"""
+import json
+import os
+
+PAYLOADS_DIR = os.environ.get('BENCH_PAYLOADS_DIR')
+ALBUM_TRACKS = int(os.environ.get('BENCH_ALBUM_TRACKS', 20))
+ARTIST_ALBUMS = int(os.environ.get('BENCH_ARTIST_ALBUMS', 50))
+TRACK_DURATION_MS = 200000
+
+
+def recorded(kind: str):
+    if not PAYLOADS_DIR:
+        return None
+    path = os.path.join(PAYLOADS_DIR, f'{kind}.json')
+    if not os.path.exists(path):
+        return None
+    with open(path) as file:
+        return json.load(file)
+
+
+def image(entity_id: str) -> list[dict]:
+    return [{'url': f'https://i.scdn.co/image/{entity_id}', 'height': 640, 'width': 640}]
+
+
+def artist_ref(artist_id: str) -> dict:
+    return {
+        'id': artist_id,
+        'name': f'Artist {artist_id}',
+        'type': 'artist',
+        'uri': f'spotify:artist:{artist_id}',
+    }
+
+
+def simple_track(track_id: str, artist_id: str) -> dict:
+    return {
+        'id': track_id,
+        'name': f'Track {track_id}',
+        'type': 'track',
+        'uri': f'spotify:track:{track_id}',
+        'duration_ms': TRACK_DURATION_MS,
+        'artists': [artist_ref(artist_id)],
+    }
+
+
+def simple_album(album_id: str) -> dict:
+    artist_id = f'ar{album_id}'
+    return {
+        'id': album_id,
+        'name': f'Album {album_id}',
+        'type': 'album',
+        'uri': f'spotify:album:{album_id}',
+        'total_tracks': ALBUM_TRACKS,
+        'release_date': '2024-01-01',
+        'images': image(album_id),
+        'artists': [artist_ref(artist_id)],
+    }
+
+
+def track(track_id: str) -> dict:
+    payload = recorded('track')
+    if payload is not None:
+        return payload
+    album_id = f'al{track_id}'
+    data = simple_track(track_id, f'ar{track_id}')
+    data['album'] = simple_album(album_id)
+    data['popularity'] = 50
+    return data
+
+
+def album(album_id: str) -> dict:
+    payload = recorded('album')
+    if payload is not None:
+        return payload
+    data = simple_album(album_id)
+    items = [simple_track(f'{album_id}t{i}', f'ar{album_id}') for i in range(ALBUM_TRACKS)]
+    data['tracks'] = {'items': items, 'total': len(items), 'next': None}
+    return data
+
+
+def artist(artist_id: str) -> dict:
+    payload = recorded('artist')
+    if payload is not None:
+        return payload
+    data = artist_ref(artist_id)
+    data.update({'images': image(artist_id), 'genres': ['bench'], 'popularity': 50})
+    return data
+
+
+def artist_top_tracks(artist_id: str) -> dict:
+    payload = recorded('artist_top_tracks')
+    if payload is not None:
+        return payload
+    return {'tracks': [track(f'{artist_id}top{i}') for i in range(10)]}
+
+
+def artist_albums(artist_id: str, limit: int) -> dict:
+    payload = recorded('artist_albums')
+    if payload is not None:
+        return payload
+    count = min(limit, ARTIST_ALBUMS)
+    items = [simple_album(f'{artist_id}al{i}') for i in range(count)]
+    return {'items': items, 'total': count, 'next': None}
+
+
+def page(items: list, limit: int, offset: int, total: int = 1000) -> dict:
+    has_next = offset + limit < total
+    return {
+        'items': items,
+        'limit': limit,
+        'offset': offset,
+        'total': total,
+        'next': 'https://api.spotify.com/v1/search?next' if has_next else None,
+    }
+
+
+def search(query: str, types: list[str], limit: int, offset: int) -> dict:
+    payload = recorded('search')
+    if payload is not None:
+        return payload
+    key = ''.join(char for char in query if char.isalnum())[:16] or 'q'
+    ids = [f'{key}{offset + i}' for i in range(limit)]
+    result = {}
+    if 'track' in types:
+        result['tracks'] = page([track(f's{i}') for i in ids], limit, offset)
+    if 'album' in types:
+        result['albums'] = page([simple_album(f's{i}') for i in ids], limit, offset)
+    if 'artist' in types:
+        result['artists'] = page([artist(f's{i}') for i in ids], limit, offset)
+    return result
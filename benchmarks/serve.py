@@ -0,0 +1,89 @@
+"""
+Runs the api (api/main.py) against local upstream stand-ins.
+pytubefix Search and YouTube are replaced with thin clients of the fake YouTube server,
+audio itself is still downloaded through pytubefix.request.stream
+
+    BENCH_YOUTUBE_URL=http://127.0.0.1:9000 python serve.py --port 8100 --reset-db
+
+"""
+import argparse
+import json
+import os
+import sys
+import urllib.parse
+import urllib.request
+
+API_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'api')
+YOUTUBE_URL = os.environ.get('BENCH_YOUTUBE_URL', 'http://127.0.0.1:9000')
+
+
+class FakeVideo:
+    def __init__(self, video_id: str, length: int):
+        self.video_id = video_id
+        self.length = length
+        self.watch_url = f'https://www.youtube.com/watch?v={video_id}'
+
+
+class FakeSearch:
+    def __init__(self, query: str):
+        url = f'{YOUTUBE_URL}/youtube/search?{urllib.parse.urlencode({"q": query})}'
+        with urllib.request.urlopen(url) as response:
+            data = json.load(response)
+        self.videos = [FakeVideo(**video) for video in data['videos']]
+
+
+class FakeStream:
+    def __init__(self, video_id: str):
+        self.url = f'{YOUTUBE_URL}/audio/{video_id}?source=bench'
+        self.filesize = None
+        self.mime_type = 'audio/mp4'
+
+
+class FakeStreams:
+    def __init__(self, video_id: str):
+        self.video_id = video_id
+
+    def get_audio_only(self):
+        return FakeStream(self.video_id)
+
+
+class FakeYouTube:
+    def __init__(self, url: str):
+        self.video_id = url.split('v=')[-1]
+        self.streams = FakeStreams(self.video_id)
+
+
+def reset_db():
+    import config
+    from accounts.models import RefreshToken, User  # noqa: F401
+    from tracks import models  # noqa: F401
+
+    config.Base.metadata.drop_all(config.engine)
+    config.Base.metadata.create_all(config.engine)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--port', type=int, default=8100)
+    parser.add_argument('--reset-db', action='store_true',
+                        help='drop and create all tables of SQLALCHEMY_DATABASE_URL')
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.abspath(API_DIR))
+    os.chdir(os.path.abspath(API_DIR))
+    if args.reset_db:
+        reset_db()
+
+    import pytubefix
+    import uvicorn
+
+    # services import these from pytubefix on use
+    pytubefix.Search = FakeSearch
+    pytubefix.YouTube = FakeYouTube
+
+    from main import create_app
+    uvicorn.run(create_app(), host='127.0.0.1', port=args.port, log_level='warning')
+
+
+if __name__ == '__main__':
+    main()
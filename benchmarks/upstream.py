@@ -0,0 +1,94 @@
+"""
+Local stand-in for Spotify Web API and YouTube, with configurable latency
+
+    uvicorn upstream:app --port 9000
+
+"""
+import asyncio
+import hashlib
+import os
+
+from fastapi import FastAPI, Request, Response
+
+import payloads
+
+SPOTIFY_LATENCY = float(os.environ.get('BENCH_SPOTIFY_LATENCY_MS', 50)) / 1000
+YOUTUBE_LATENCY = float(os.environ.get('BENCH_YOUTUBE_LATENCY_MS', 200)) / 1000
+AUDIO_BYTES = int(os.environ.get('BENCH_AUDIO_BYTES', 3 * 1024 * 1024))
+
+app = FastAPI()
+audio = (b'\x00\x01\x02\x03' * (AUDIO_BYTES // 4 + 1))[:AUDIO_BYTES]
+
+
+@app.middleware('http')
+async def latency(request: Request, call_next):
+    if request.url.path.startswith(('/v1/', '/api/token')):
+        await asyncio.sleep(SPOTIFY_LATENCY)
+    elif request.url.path.startswith(('/youtube/', '/audio/')):
+        await asyncio.sleep(YOUTUBE_LATENCY)
+    return await call_next(request)
+
+
+@app.post('/api/token')
+def token():
+    return {'access_token': 'bench', 'token_type': 'Bearer', 'expires_in': 3600}
+
+
+@app.get('/v1/search')
+def search(q: str, type: str = 'track', limit: int = 10, offset: int = 0):
+    return payloads.search(q, type.split(','), limit, offset)
+
+
+# spotipy requests multiple items as tracks/?ids=...
+@app.get('/v1/tracks/')
+@app.get('/v1/tracks')
+def tracks(ids: str):
+    return {'tracks': [payloads.track(track_id) for track_id in ids.split(',')]}
+
+
+@app.get('/v1/tracks/{track_id}')
+def track(track_id: str):
+    return payloads.track(track_id)
+
+
+@app.get('/v1/albums/')
+@app.get('/v1/albums')
+def albums(ids: str):
+    return {'albums': [payloads.album(album_id) for album_id in ids.split(',')]}
+
+
+@app.get('/v1/albums/{album_id}')
+def album(album_id: str):
+    return payloads.album(album_id)
+
+
+@app.get('/v1/artists/{artist_id}')
+def artist(artist_id: str):
+    return payloads.artist(artist_id)
+
+
+@app.get('/v1/artists/{artist_id}/top-tracks')
+def artist_top_tracks(artist_id: str):
+    return payloads.artist_top_tracks(artist_id)
+
+
+@app.get('/v1/artists/{artist_id}/albums')
+def artist_albums(artist_id: str, limit: int = 20):
+    return payloads.artist_albums(artist_id, limit)
+
+
+# search results page of YouTube, reduced to what the app reads
+@app.get('/youtube/search')
+def youtube_search(q: str):
+    video_id = hashlib.md5(q.encode()).hexdigest()[:11]
+    return {'videos': [{'video_id': video_id, 'length': payloads.TRACK_DURATION_MS // 1000}]}
+
+
+# audio stream, `range` query param works like googlevideo urls do
+@app.get('/audio/{video_id}')
+def audio_stream(video_id: str, range: str = None):
+    start, end = 0, len(audio) - 1
+    if range:
+        first, last = range.split('-')
+        start, end = int(first), min(int(last), len(audio) - 1)
+    return Response(audio[start:end + 1], media_type='audio/mp4')